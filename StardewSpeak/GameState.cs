@@ -104,6 +104,7 @@ namespace StardewSpeak
                     var center = new List<int> { animal.getStandingX(), animal.getStandingY() };
                     var animalObj = new
                     {
+                        id = animal.myID.Value,
                         position,
                         center,
                         tileX = animal.getTileX(),
@@ -0,0 +1,88 @@
+﻿using Newtonsoft.Json;
+using Newtonsoft.Json.Linq;
+using StardewValley;
+using StardewValley.Menus;
+using System;
+using System.Security.Cryptography;
+using System.Text;
+
+namespace StardewSpeak
+{
+    // Keeps the last serialized active menu with a revision that goes up whenever its content changes, so the
+    // client can tell from a small notification whether its copy of the menu is out of date.
+    public static class MenuTracker
+    {
+        // the cheap fingerprint is compared this often, the menu is serialized and hashed anyway at the slower interval
+        public const int CheckIntervalTicks = 10;
+        public const int FullCheckIntervalTicks = 60;
+        public static int Revision { get; private set; }
+        public static string Hash { get; private set; }
+        public static JToken Menu { get; private set; } = JValue.CreateNull();
+        // requests also update the tracker, so a change can be seen first by something other than the push
+        public static int LastPushedRevision { get; set; }
+        static int lastUpdateTick = -1;
+        static object lastFingerprint;
+
+        static readonly JsonSerializer Serializer = JsonSerializer.Create(
+            new JsonSerializerSettings() { ReferenceLoopHandling = ReferenceLoopHandling.Ignore });
+
+        // Serializes the active menu and returns true if it's different from the last time
+        public static bool Update()
+        {
+            lastUpdateTick = Game1.ticks;
+            lastFingerprint = Fingerprint();
+            object serialized = Utils.SerializeMenu(Game1.activeClickableMenu);
+            JToken menu = serialized == null ? JValue.CreateNull() : JToken.FromObject(serialized, Serializer);
+            string hash = ContentHash(menu);
+            if (hash == Hash) return false;
+            Hash = hash;
+            Menu = menu;
+            Revision++;
+            return true;
+        }
+
+        // Serializes the menu again only if its fingerprint changed since the last update
+        public static bool UpdateIfChanged()
+        {
+            if (lastUpdateTick == Game1.ticks || Equals(Fingerprint(), lastFingerprint)) return false;
+            return Update();
+        }
+
+        // The tracked revision, only serialized again if the menu's fingerprint moved since the last update
+        public static int CurrentRevision()
+        {
+            UpdateIfChanged();
+            return Revision;
+        }
+
+        // Which menu is open, where it is, what has focus and where the mouse is. Cheap to compare every few ticks,
+        // anything it misses is picked up by the full check.
+        static object Fingerprint()
+        {
+            IClickableMenu menu = Game1.activeClickableMenu;
+            if (menu == null) return null;
+            int tab = menu is GameMenu gameMenu ? gameMenu.currentTab : -1;
+            int snapped = menu.currentlySnappedComponent?.myID ?? -1;
+            return (menu, menu.GetChildMenu(), tab, snapped, menu.xPositionOnScreen, menu.yPositionOnScreen, menu.width,
+                menu.height, Game1.getMouseX(), Game1.getMouseY());
+        }
+
+        public static object Notification()
+        {
+            string menuType = Menu is JObject menu ? (string)menu["menuType"] : null;
+            return new { revision = Revision, hash = Hash, menuType };
+        }
+
+        public static object Snapshot()
+        {
+            return new { revision = Revision, hash = Hash, menu = Menu };
+        }
+
+        static string ContentHash(JToken menu)
+        {
+            using var sha1 = SHA1.Create();
+            byte[] digest = sha1.ComputeHash(Encoding.UTF8.GetBytes(menu.ToString(Formatting.None)));
+            return BitConverter.ToString(digest, 0, 8).Replace("-", "");
+        }
+    }
+}
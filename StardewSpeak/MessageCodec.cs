@@ -0,0 +1,254 @@
+﻿using Newtonsoft.Json;
+using Newtonsoft.Json.Linq;
+using System;
+using System.Collections.Generic;
+using System.IO;
+using System.Linq;
+using System.Text;
+
+namespace StardewSpeak
+{
+    public interface IMessageCodec
+    {
+        string Name { get; }
+        byte[] Encode(object message, JsonSerializer serializer);
+    }
+
+    public class JsonMessageCodec : IMessageCodec
+    {
+        public string Name => "json";
+
+        public byte[] Encode(object message, JsonSerializer serializer)
+        {
+            using var writer = new StringWriter();
+            serializer.Serialize(writer, message);
+            return Encoding.UTF8.GetBytes(writer.ToString());
+        }
+    }
+
+    public class MessagePackMessageCodec : IMessageCodec
+    {
+        public string Name => "msgpack";
+
+        public byte[] Encode(object message, JsonSerializer serializer)
+        {
+            JToken token = message == null ? JValue.CreateNull() : JToken.FromObject(message, serializer);
+            using var stream = new MemoryStream();
+            using (var writer = new BinaryWriter(stream))
+            {
+                MessagePack.Write(writer, token);
+            }
+            return stream.ToArray();
+        }
+    }
+
+    public static class MessageCodec
+    {
+        public static readonly IMessageCodec Json = new JsonMessageCodec();
+        public static readonly IMessageCodec MessagePack = new MessagePackMessageCodec();
+        static readonly List<IMessageCodec> Supported = new() { MessagePack, Json };
+
+        // Client lists codecs in order of preference; fall back to JSON if we don't share any
+        public static IMessageCodec Choose(IEnumerable<string> clientCodecs)
+        {
+            foreach (string name in clientCodecs)
+            {
+                var codec = Supported.FirstOrDefault(x => x.Name == name);
+                if (codec != null) return codec;
+            }
+            return Json;
+        }
+
+        // JSON frames always start with '{', MessagePack maps never do, so no need to track what the client is using
+        public static JToken Decode(byte[] frame)
+        {
+            if (frame.Length > 0 && frame[0] == (byte)'{')
+            {
+                return JToken.Parse(Encoding.UTF8.GetString(frame));
+            }
+            using var reader = new BinaryReader(new MemoryStream(frame));
+            return StardewSpeak.MessagePack.Read(reader);
+        }
+    }
+
+    /// <summary>Minimal MessagePack reader/writer for JSON-shaped data.</summary>
+    public static class MessagePack
+    {
+        public static void Write(BinaryWriter w, JToken token)
+        {
+            switch (token.Type)
+            {
+                case JTokenType.Object:
+                    {
+                        var obj = (JObject)token;
+                        WriteHeader(w, obj.Count, 0x80, 0xde);
+                        foreach (var prop in obj.Properties())
+                        {
+                            WriteString(w, prop.Name);
+                            Write(w, prop.Value);
+                        }
+                        break;
+                    }
+                case JTokenType.Array:
+                    {
+                        var arr = (JArray)token;
+                        WriteHeader(w, arr.Count, 0x90, 0xdc);
+                        foreach (var item in arr) Write(w, item);
+                        break;
+                    }
+                case JTokenType.Integer:
+                    WriteInteger(w, token.Value<long>());
+                    break;
+                case JTokenType.Float:
+                    w.Write((byte)0xcb);
+                    WriteBigEndian(w, BitConverter.DoubleToInt64Bits(token.Value<double>()), 8);
+                    break;
+                case JTokenType.Boolean:
+                    w.Write(token.Value<bool>() ? (byte)0xc3 : (byte)0xc2);
+                    break;
+                case JTokenType.Null:
+                case JTokenType.Undefined:
+                    w.Write((byte)0xc0);
+                    break;
+                case JTokenType.Bytes:
+                    {
+                        byte[] bytes = token.Value<byte[]>();
+                        w.Write((byte)0xc6);
+                        WriteBigEndian(w, bytes.Length, 4);
+                        w.Write(bytes);
+                        break;
+                    }
+                default:
+                    // strings, dates, guids etc. are all strings in JSON as well
+                    WriteString(w, token.ToString());
+                    break;
+            }
+        }
+
+        static void WriteHeader(BinaryWriter w, int count, byte fixPrefix, byte prefix16)
+        {
+            if (count < 16) w.Write((byte)(fixPrefix | count));
+            else if (count <= ushort.MaxValue)
+            {
+                w.Write(prefix16);
+                WriteBigEndian(w, count, 2);
+            }
+            else
+            {
+                w.Write((byte)(prefix16 + 1));
+                WriteBigEndian(w, count, 4);
+            }
+        }
+
+        static void WriteString(BinaryWriter w, string s)
+        {
+            byte[] bytes = Encoding.UTF8.GetBytes(s);
+            int len = bytes.Length;
+            if (len < 32) w.Write((byte)(0xa0 | len));
+            else if (len <= byte.MaxValue)
+            {
+                w.Write((byte)0xd9);
+                w.Write((byte)len);
+            }
+            else if (len <= ushort.MaxValue)
+            {
+                w.Write((byte)0xda);
+                WriteBigEndian(w, len, 2);
+            }
+            else
+            {
+                w.Write((byte)0xdb);
+                WriteBigEndian(w, len, 4);
+            }
+            w.Write(bytes);
+        }
+
+        static void WriteInteger(BinaryWriter w, long n)
+        {
+            if (n >= 0 && n < 128) w.Write((byte)n);
+            else if (n < 0 && n >= -32) w.Write((byte)(sbyte)n);
+            else if (n >= int.MinValue && n <= int.MaxValue)
+            {
+                w.Write((byte)0xd2);
+                WriteBigEndian(w, n, 4);
+            }
+            else
+            {
+                w.Write((byte)0xd3);
+                WriteBigEndian(w, n, 8);
+            }
+        }
+
+        static void WriteBigEndian(BinaryWriter w, long value, int size)
+        {
+            for (int i = size - 1; i >= 0; i--) w.Write((byte)(value >> (8 * i)));
+        }
+
+        public static JToken Read(BinaryReader r)
+        {
+            byte b = r.ReadByte();
+            if (b <= 0x7f) return new JValue((long)b);
+            if (b >= 0xe0) return new JValue((long)(sbyte)b);
+            if ((b & 0xf0) == 0x80) return ReadMap(r, b & 0x0f);
+            if ((b & 0xf0) == 0x90) return ReadArray(r, b & 0x0f);
+            if ((b & 0xe0) == 0xa0) return new JValue(ReadString(r, b & 0x1f));
+            switch (b)
+            {
+                case 0xc0: return JValue.CreateNull();
+                case 0xc2: return new JValue(false);
+                case 0xc3: return new JValue(true);
+                case 0xc4: return new JValue(r.ReadBytes((int)ReadBigEndian(r, 1)));
+                case 0xc5: return new JValue(r.ReadBytes((int)ReadBigEndian(r, 2)));
+                case 0xc6: return new JValue(r.ReadBytes((int)ReadBigEndian(r, 4)));
+                case 0xca: return new JValue(BitConverter.Int32BitsToSingle((int)ReadBigEndian(r, 4)));
+                case 0xcb: return new JValue(BitConverter.Int64BitsToDouble(ReadBigEndian(r, 8)));
+                case 0xcc: return new JValue(ReadBigEndian(r, 1));
+                case 0xcd: return new JValue(ReadBigEndian(r, 2));
+                case 0xce: return new JValue(ReadBigEndian(r, 4));
+                case 0xcf: return new JValue(ReadBigEndian(r, 8));
+                case 0xd0: return new JValue((long)(sbyte)ReadBigEndian(r, 1));
+                case 0xd1: return new JValue((long)(short)ReadBigEndian(r, 2));
+                case 0xd2: return new JValue((long)(int)ReadBigEndian(r, 4));
+                case 0xd3: return new JValue(ReadBigEndian(r, 8));
+                case 0xd9: return new JValue(ReadString(r, (int)ReadBigEndian(r, 1)));
+                case 0xda: return new JValue(ReadString(r, (int)ReadBigEndian(r, 2)));
+                case 0xdb: return new JValue(ReadString(r, (int)ReadBigEndian(r, 4)));
+                case 0xdc: return ReadArray(r, (int)ReadBigEndian(r, 2));
+                case 0xdd: return ReadArray(r, (int)ReadBigEndian(r, 4));
+                case 0xde: return ReadMap(r, (int)ReadBigEndian(r, 2));
+                case 0xdf: return ReadMap(r, (int)ReadBigEndian(r, 4));
+            }
+            throw new InvalidDataException($"Unsupported MessagePack type byte 0x{b:x2}");
+        }
+
+        static JObject ReadMap(BinaryReader r, int count)
+        {
+            var obj = new JObject();
+            for (int i = 0; i < count; i++)
+            {
+                string key = Read(r).ToString();
+                obj[key] = Read(r);
+            }
+            return obj;
+        }
+
+        static JArray ReadArray(BinaryReader r, int count)
+        {
+            var arr = new JArray();
+            for (int i = 0; i < count; i++) arr.Add(Read(r));
+            return arr;
+        }
+
+        static string ReadString(BinaryReader r, int len)
+        {
+            return Encoding.UTF8.GetString(r.ReadBytes(len));
+        }
+
+        static long ReadBigEndian(BinaryReader r, int size)
+        {
+            long value = 0;
+            for (int i = 0; i < size; i++) value = (value << 8) | r.ReadByte();
+            return value;
+        }
+    }
+}
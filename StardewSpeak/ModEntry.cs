@@ -26,6 +26,7 @@ namespace StardewSpeak
     {
         internal static bool FeedLocation = false;
         public static ConcurrentQueue<dynamic> UpdateTickedRequestQueue;
+        public static ConcurrentQueue<dynamic> UrgentRequestQueue;
         public static ConcurrentQueue<dynamic> UpdateTickingRequestQueue;
         SpeechEngine speechEngine;
         EventHandler eventHandler;
@@ -49,6 +50,7 @@ namespace StardewSpeak
             ModEntry.helper = helper;
             ModEntry.Config = this.Helper.ReadConfig<ModConfig>();
             ModEntry.UpdateTickedRequestQueue = new ConcurrentQueue<dynamic>();
+            ModEntry.UrgentRequestQueue = new ConcurrentQueue<dynamic>();
             ModEntry.UpdateTickingRequestQueue = new ConcurrentQueue<dynamic>();
             this.speechEngine = new SpeechEngine(OnSpeechEngineInput);
             this.eventHandler = new EventHandler(helper, this.speechEngine);
@@ -64,6 +66,7 @@ namespace StardewSpeak
             helper.Events.World.ObjectListChanged += this.OnObjectListChanged;
             helper.Events.World.LargeTerrainFeatureListChanged += this.OnLargeTerrainFeatureListChanged;
             helper.Events.GameLoop.SaveLoaded += this.OnSaveLoaded;
+            helper.Events.GameLoop.DayStarted += this.OnDayStarted;
             helper.Events.World.LocationListChanged += this.OnLocationListChanged;
             helper.ConsoleCommands.Add("mimic", "Mimic speech recognition, e.g. \"mimic load game\"", Command_MimicSpeech);
         }
@@ -81,6 +84,27 @@ namespace StardewSpeak
             //{
             //    UpdateTickedRequestQueue.Enqueue(msg);
             //}
+            else if (msgType == "CANCEL_REQUEST")
+            {
+                // handled right away so requests still waiting in a queue are skipped
+                Requests.Cancel(msg.data);
+            }
+            else if (msgType == "SUBSCRIBE_EVENTS")
+            {
+                this.speechEngine.SubscribeEvents(msg.data.ToObject<List<string>>());
+            }
+            else if (msgType == "REQUEST_BATCH" && SpeechEngine.IsAutoBatch(msg))
+            {
+                // requests the client gathered in one loop turn, each answered with its own response
+                foreach (dynamic batchedMsg in msg.data)
+                {
+                    OnSpeechEngineInput(batchedMsg);
+                }
+            }
+            else if (SpeechEngine.IsUrgent(msg))
+            {
+                UrgentRequestQueue.Enqueue(msg);
+            }
             else
             {
                 UpdateTickedRequestQueue.Enqueue(msg);
@@ -111,9 +135,15 @@ namespace StardewSpeak
             this.speechEngine.SendEvent("SAVE_LOADED");
         }
 
+        private void OnDayStarted(object sender, DayStartedEventArgs e)
+        {
+            this.speechEngine.SendEvent("DAY_STARTED");
+        }
+
         private void OnLocationListChanged(object sender, LocationListChangedEventArgs e)
         {
             Routing.Reset();
+            this.speechEngine.SendEvent("LOCATION_LIST_CHANGED");
         }
 
         private void OnButtonsChanged(object sender, ButtonsChangedEventArgs e) 
@@ -149,17 +179,25 @@ namespace StardewSpeak
                     this.speechEngine.SendMessage("STREAM_MESSAGE", message);
                 }
             }
+            this.speechEngine.SendEvent("WARPED", warpEvent);
         }
 
         private void OnMenuChanged(object sender, MenuChangedEventArgs e) 
         {
-            var serializedEvent = new
-            {
-                oldMenu = Utils.SerializeMenu(e.OldMenu),
-                newMenu = Utils.SerializeMenu(e.NewMenu),
-            };
-            this.MessageStreams("ON_MENU_CHANGED", serializedEvent);
+            this.PushMenuRevision(true);
+        }
 
+        // Menus also change without MenuChanged, e.g. scrolling or hovering, so the tracker is checked
+        // regularly as well, a full check only at FullCheckIntervalTicks and otherwise just when the menu's
+        // fingerprint moved. Only the revision and hash are pushed, the client fetches the menu if it needs it.
+        private void PushMenuRevision(bool full)
+        {
+            if (!ModEntry.Streams.Values.Any(s => s.Name == "ON_MENU_CHANGED")) return;
+            if (full) MenuTracker.Update();
+            else MenuTracker.UpdateIfChanged();
+            if (MenuTracker.Revision == MenuTracker.LastPushedRevision) return;
+            MenuTracker.LastPushedRevision = MenuTracker.Revision;
+            this.MessageStreams("ON_MENU_CHANGED", MenuTracker.Notification());
         }
 
         private void MessageStreams(string streamName, dynamic messageValue) 
@@ -183,11 +221,13 @@ namespace StardewSpeak
         {
             var changedEvent = new { location = e.Location.NameOrUniqueName };
             this.MessageStreams("ON_OBJECT_LIST_CHANGED", changedEvent);
+            this.speechEngine.SendEvent("OBJECT_LIST_CHANGED", changedEvent);
         }
 
         private void OnLargeTerrainFeatureListChanged(object sender, LargeTerrainFeatureListChangedEventArgs e) 
         {
-
+            var changedEvent = new { location = e.Location.NameOrUniqueName };
+            this.speechEngine.SendEvent("LARGE_TERRAIN_FEATURE_LIST_CHANGED", changedEvent);
         }
         private void RespondToQueuedRequests(ConcurrentQueue<dynamic> queue, string gameLoopContext, int timeLimit = 5) 
         {
@@ -214,14 +254,39 @@ namespace StardewSpeak
         {
             if (Game1.activeClickableMenu is ShippingMenu)
             {
+                RespondToQueuedRequests(UrgentRequestQueue, "UnvalidatedUpdateTicked", int.MaxValue);
                 RespondToQueuedRequests(UpdateTickedRequestQueue, "UnvalidatedUpdateTicked");
+                this.RunUiSequences();
+                this.SendGameTicks(e);
             }
         }
 
+        // UpdateTicked isn't raised while the shipping menu is up, but the client still waits on game ticks
+        private void SendGameTicks(UnvalidatedUpdateTickedEventArgs e)
+        {
+            foreach (var pair in ModEntry.Streams)
+            {
+                var stream = pair.Value;
+                if (stream.Name != "UPDATE_TICKED" || (string)stream.Data.type != "GAME_TICK") continue;
+                if (!e.IsMultipleOf((uint)stream.Data.ticks)) continue;
+                var message = new { stream_id = pair.Key, value = Game1.ticks, error = (string)null };
+                this.speechEngine.SendMessage("STREAM_MESSAGE", message);
+            }
+        }
+
+        private void RunUiSequences()
+        {
+            UiSequence.RunAll((id, value, error) => this.speechEngine.SendResponse(id, value, error));
+        }
+
         private void GameLoop_UpdateTicked(object sender, UpdateTickedEventArgs e)
         {
             eventHandler.CheckNewInGameEvent();
+            // urgent requests (stop, movement) aren't limited by the time budget and never wait behind bulk queries
+            RespondToQueuedRequests(UrgentRequestQueue, "UpdateTicked", int.MaxValue);
             RespondToQueuedRequests(UpdateTickedRequestQueue, "UpdateTicked");
+            this.RunUiSequences();
+            if (e.IsMultipleOf(MenuTracker.CheckIntervalTicks)) this.PushMenuRevision(e.IsMultipleOf(MenuTracker.FullCheckIntervalTicks));
             foreach (var pair in ModEntry.Streams)
             {
                 var id = pair.Key;
@@ -239,6 +304,21 @@ namespace StardewSpeak
                     value = exception.ToString();
                     error = "STREAM_EXCEPTION";
                 }
+                if (error == null)
+                {
+                    value = stream.NextValue(value, out string delta);
+                    if (stream.ShouldSkip(value, delta, e.Ticks)) continue;
+                    if (delta != null)
+                    {
+                        this.speechEngine.SendMessage("STREAM_MESSAGE", new { stream_id = id, value, error, delta });
+                        continue;
+                    }
+                    // the next tick's value often replaces this one before the client reads it, so the client
+                    // only decodes it on demand
+                    var encodedValue = this.speechEngine.EncodePayload(value);
+                    this.speechEngine.SendMessage("STREAM_MESSAGE", new { stream_id = id, value = encodedValue, error, encoded = true });
+                    continue;
+                }
                 var message = new { stream_id = id, value, error };
                 this.speechEngine.SendMessage("STREAM_MESSAGE", message);
             }
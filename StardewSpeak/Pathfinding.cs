@@ -61,6 +61,7 @@ namespace StardewSpeak.Pathfinder
 		private static PriorityQueue<float> _openList = new PriorityQueue<float>();
 		private static HashSet<int> _closedList = new HashSet<int>();
 		private static int _counter = 0;
+		private const int CancellationCheckInterval = 256;
 		public delegate bool isAtEnd(PathNode currentNode, Point endPoint, GameLocation location, Character c);
 		public delegate bool adjustTileScore(PathNode currentNode, Point startPoint, GameLocation location, int currentScore);
 		public static dynamic FindPath(GameLocation location, int startX, int startY, int targetX, int targetY, int limit = -1)
@@ -124,6 +125,10 @@ namespace StardewSpeak.Pathfinder
 						}
 					}
 					iterations++;
+					if (iterations % CancellationCheckInterval == 0 && Requests.IsCancelled())
+					{
+						throw new OperationCanceledException("Path request cancelled");
+					}
 					if (limit >= 0)
 					{
 						if (iterations >= limit)
@@ -162,6 +167,40 @@ namespace StardewSpeak.Pathfinder
 			return !location.isCollidingPosition(rect, Game1.viewport, true, 0, glider: false, Game1.player, pathfinding: true);
 		}
 
+		// isTileWalkable for every tile of the location as a bitset, row by row and lowest bit first, so the
+		// client can answer path queries itself. Has a one tile border since end points can be off the map.
+		public static dynamic PassabilityGrid(GameLocation location)
+		{
+			var layer = location.map.Layers[0];
+			int originX = -1;
+			int originY = -1;
+			int width = layer.LayerWidth + 2;
+			int height = layer.LayerHeight + 2;
+			var bits = new byte[(width * height + 7) / 8];
+			for (int y = 0; y < height; y++)
+			{
+				for (int x = 0; x < width; x++)
+				{
+					if (isTileWalkable(location, originX + x, originY + y))
+					{
+						int i = y * width + x;
+						bits[i >> 3] |= (byte)(1 << (i & 7));
+					}
+				}
+			}
+			return new
+			{
+				location = location.NameOrUniqueName,
+				mapWidth = layer.LayerWidth,
+				mapHeight = layer.LayerHeight,
+				originX,
+				originY,
+				width,
+				height,
+				tiles = Convert.ToBase64String(bits),
+			};
+		}
+
 		public static List<int> SearchDirections(Point start, Point end)
 		{
 			int xDiff = end.X - start.X;
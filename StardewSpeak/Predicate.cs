@@ -0,0 +1,86 @@
+﻿using Newtonsoft.Json.Linq;
+using System;
+using System.Collections.Generic;
+using System.IO;
+using System.Linq;
+using System.Text;
+
+namespace StardewSpeak
+{
+    // Evaluates predicate specs sent by the speech client (predicates.py) against a stream value
+    public static class Predicate
+    {
+        public static bool Evaluate(JToken spec, JToken value)
+        {
+            string op = (string)spec["op"];
+            switch (op)
+            {
+                case "and":
+                    return spec["args"].All(arg => Evaluate(arg, value));
+                case "or":
+                    return spec["args"].Any(arg => Evaluate(arg, value));
+                case "not":
+                    return !Evaluate(spec["arg"], value);
+                case "truthy":
+                    return IsTruthy(Field(spec, value));
+                case "eq":
+                    return AreEqual(Field(spec, value) ?? JValue.CreateNull(), spec["value"]);
+                case "ne":
+                    return !AreEqual(Field(spec, value) ?? JValue.CreateNull(), spec["value"]);
+                case "lt":
+                case "le":
+                case "gt":
+                case "ge":
+                    {
+                        var actual = Field(spec, value);
+                        if (actual == null || actual.Type == JTokenType.Null) return false;
+                        int cmp = Compare(actual, spec["value"]);
+                        return op == "lt" ? cmp < 0 : op == "le" ? cmp <= 0 : op == "gt" ? cmp > 0 : cmp >= 0;
+                    }
+            }
+            throw new InvalidDataException($"Unknown predicate op {op}");
+        }
+
+        static JToken Field(JToken spec, JToken value)
+        {
+            return value is JObject obj ? obj[(string)spec["field"]] : null;
+        }
+
+        static bool IsNumber(JToken token) => token.Type is JTokenType.Integer or JTokenType.Float;
+
+        // 2 == 2.0 like it is in Python
+        static bool AreEqual(JToken actual, JToken expected)
+        {
+            if (IsNumber(actual) && IsNumber(expected)) return actual.Value<double>() == expected.Value<double>();
+            return JToken.DeepEquals(actual, expected);
+        }
+
+        static int Compare(JToken actual, JToken expected)
+        {
+            if (IsNumber(actual)) return actual.Value<double>().CompareTo(expected.Value<double>());
+            return string.CompareOrdinal(actual.ToString(), expected.ToString());
+        }
+
+        static bool IsTruthy(JToken token)
+        {
+            if (token == null) return false;
+            switch (token.Type)
+            {
+                case JTokenType.Null:
+                case JTokenType.Undefined:
+                    return false;
+                case JTokenType.Boolean:
+                    return token.Value<bool>();
+                case JTokenType.Integer:
+                case JTokenType.Float:
+                    return token.Value<double>() != 0;
+                case JTokenType.String:
+                    return token.Value<string>().Length > 0;
+                case JTokenType.Array:
+                case JTokenType.Object:
+                    return token.HasValues;
+            }
+            return true;
+        }
+    }
+}
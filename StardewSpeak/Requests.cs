@@ -7,6 +7,7 @@ using StardewModdingAPI;
 using StardewValley;
 using StardewValley.Objects;
 using System;
+using System.Collections.Concurrent;
 using System.Collections.Generic;
 using System.Diagnostics;
 using System.IO;
@@ -22,10 +23,45 @@ namespace StardewSpeak
 {
     class Requests
     {
+        // request id -> when the client gave up on it. Written from the pipe reader thread.
+        static readonly ConcurrentDictionary<string, DateTime> CancelledRequests = new();
+        static readonly TimeSpan ForgetCancelledAfter = TimeSpan.FromMinutes(1);
+        [ThreadStatic] static string CurrentRequestId;
+        // the id exactly as the client sent it, for responses sent later than the request is handled
+        [ThreadStatic] static object CurrentRequestMessageId;
+
+        public static void Cancel(dynamic requestId)
+        {
+            var now = DateTime.UtcNow;
+            // a cancel can cross the response on the pipe, so old entries are dropped here rather than never
+            foreach (var pair in CancelledRequests)
+            {
+                if (now - pair.Value > ForgetCancelledAfter) CancelledRequests.TryRemove(pair.Key, out _);
+            }
+            CancelledRequests[requestId.ToString()] = now;
+        }
+
+        public static bool IsCancelled(dynamic requestId)
+        {
+            return requestId != null && CancelledRequests.ContainsKey(requestId.ToString());
+        }
+
+        public static void Forget(dynamic requestId)
+        {
+            CancelledRequests.TryRemove(requestId.ToString(), out _);
+        }
+
+        // Checked by long running requests such as pathfinding
+        public static bool IsCancelled()
+        {
+            return CurrentRequestId != null && CancelledRequests.ContainsKey(CurrentRequestId);
+        }
 
         public static dynamic HandleRequest(dynamic request)
         {
             dynamic error = null;
+            CurrentRequestId = request.id?.ToString();
+            CurrentRequestMessageId = request.id;
             try
             {
                 string msgType = request.type;
@@ -39,6 +75,12 @@ namespace StardewSpeak
                 error = "STACK_TRACE";
                 return new { body, error };
             }
+            finally
+            {
+                if (CurrentRequestId != null) CancelledRequests.TryRemove(CurrentRequestId, out _);
+                CurrentRequestId = null;
+                CurrentRequestMessageId = null;
+            }
         }
 
         public static dynamic HandleRequestMessage(string msgType, dynamic data = null)
@@ -51,6 +93,11 @@ namespace StardewSpeak
             {
                 case "HEARTBEAT": // engine will shutdown if heartbeat not received after 10 seconds
                     return null;
+                case "NEGOTIATE_CODEC":
+                    {
+                        List<string> codecs = data.codecs.ToObject<List<string>>();
+                        return MessageCodec.Choose(codecs).Name;
+                    }
                 case "REQUEST_BATCH":
                     var body = new List<dynamic>();
                     foreach (dynamic batchedRequest in data)
@@ -60,6 +107,8 @@ namespace StardewSpeak
                         body.Add(HandleRequestMessage(batchedMsgType, batchedMsgData));
                     }
                     return body;
+                case "GAME_TICK":
+                    return Game1.ticks;
                 case "PLAYER_STATUS":
                     return GameState.PlayerStatus();
                 case "TOOL_STATUS":
@@ -96,6 +145,18 @@ namespace StardewSpeak
                         ModEntry.Streams = newStreams;
                         return true;
                     }
+                case "UPDATE_STREAM":
+                    {
+                        // client adjusts the update interval to how fast it actually reads values
+                        string streamId = data.stream_id;
+                        int ticks = data.ticks;
+                        if (ModEntry.Streams.TryGetValue(streamId, out Stream stream) && stream.Data is JObject streamData)
+                        {
+                            streamData["ticks"] = Math.Max(ticks, 1);
+                            return true;
+                        }
+                        return false;
+                    }
                 case "STOP_STREAM":
                     {
                         string streamId = data;
@@ -126,6 +187,8 @@ namespace StardewSpeak
                         var path = Pathfinder.Pathfinder.FindPath(player.currentLocation, playerX, playerY, targetX, targetY, cutoff);
                         return path;
                     }
+                case "GET_PASSABILITY_GRID":
+                    return Pathfinder.Pathfinder.PassabilityGrid(player.currentLocation);
                 case "PATH_TO_EDGE":
                     {
                         int direction = data.direction;
@@ -407,6 +470,14 @@ namespace StardewSpeak
                     }
                 case "GET_ACTIVE_MENU":
                     return Utils.SerializeMenu(Game1.activeClickableMenu);
+                case "GET_MENU_SNAPSHOT":
+                    MenuTracker.Update();
+                    return MenuTracker.Snapshot();
+                case "IS_MENU_REVISION_CURRENT":
+                    {
+                        int revision = data.revision;
+                        return MenuTracker.CurrentRevision() == revision;
+                    }
                 case "GET_MOUSE_POSITION":
                     {
                         return new List<int> { Game1.getMouseX(), Game1.getMouseY() };
@@ -443,6 +514,9 @@ namespace StardewSpeak
                         Game1.setMousePosition(Game1.getMouseX() + x, Game1.getMouseY() + y);
                         return true;
                     }
+                case "UI_SEQUENCE":
+                    // answered by UiSequence.RunAll once every step has run
+                    return UiSequence.Start(CurrentRequestMessageId, data.steps);
                 case "MOUSE_CLICK":
                     {
                         string btn = data.btn;
@@ -27,9 +27,9 @@ namespace StardewSpeak
         public readonly Action<dynamic> OnMessage;
         public HashSet<string> UnvalidatedModeAllowableMessageTypes = new()
         { 
-            "HEARTBEAT", "REQUEST_BATCH", "NEW_STREAM", "STOP_STREAM", "GET_ACTIVE_MENU", "GET_MOUSE_POSITION",
-            "SET_MOUSE_POSITION", "SET_MOUSE_POSITION_RELATIVE", "MOUSE_CLICK", "UPDATE_HELD_BUTTONS", "RELEASE_ALL_KEYS",
-            "PRESS_KEY"
+            "HEARTBEAT", "REQUEST_BATCH", "NEW_STREAM", "STOP_STREAM", "UPDATE_STREAM", "GET_ACTIVE_MENU", "GET_MENU_SNAPSHOT", "IS_MENU_REVISION_CURRENT", "GET_MOUSE_POSITION",
+            "SET_MOUSE_POSITION", "SET_MOUSE_POSITION_RELATIVE", "MOUSE_CLICK", "UI_SEQUENCE", "UPDATE_HELD_BUTTONS", "RELEASE_ALL_KEYS",
+            "PRESS_KEY", "NEGOTIATE_CODEC"
         };
         public SpeechProcessNamedPipe NamedPipe;
 
@@ -122,6 +122,12 @@ namespace StardewSpeak
 
         public void RespondToMessage(dynamic msg, string gameLoopContext) 
         {   
+            if (Requests.IsCancelled(msg.id))
+            {
+                // the client has already given up on this one, no response needed
+                Requests.Forget(msg.id);
+                return;
+            }
             dynamic resp;
             bool unvalidatedGameContext = gameLoopContext == "UnvalidatedUpdateTicked";
             try
@@ -140,16 +146,22 @@ namespace StardewSpeak
                 string error = "STACK_TRACE";
                 resp = new { body, error };
             }
-            string msgId = msg.id;
-            this.SendResponse(msgId, resp.body, resp.error);
+            object msgId = msg.id;
+            if (ReferenceEquals((object)resp.body, UiSequence.Deferred)) return;
+            this.SendResponse(msgId, resp.body, resp.error, IsUrgent(msg));
+            if ((string)msg.type == "NEGOTIATE_CODEC" && resp.error == null)
+            {
+                // only switch after the response is queued so the client can always read the answer
+                this.NamedPipe.Codec = MessageCodec.Choose(new List<string> { (string)resp.body });
+            }
         }
 
-        void OnNamedPipeInput(string messageText) 
+        void OnNamedPipeInput(byte[] frame) 
         {
             dynamic msg;
             try
             {
-                msg = JsonConvert.DeserializeObject(messageText);
+                msg = MessageCodec.Decode(frame);
             }
             catch
             {
@@ -158,29 +170,66 @@ namespace StardewSpeak
             this.OnMessage(msg);
         }
 
-        void SendResponse(string id, object value = null, object error = null) 
+        public static bool IsUrgent(dynamic msg)
+        {
+            return msg.priority != null && (int)msg.priority == 0;
+        }
+
+        // Batch entries that carry their own id are independent requests rather than one REQUEST_BATCH request
+        public static bool IsAutoBatch(dynamic msg)
+        {
+            foreach (dynamic batchedMsg in msg.data)
+            {
+                return batchedMsg.id != null;
+            }
+            return false;
+        }
+
+        public void SendResponse(object id, object value = null, object error = null, bool urgent = false) 
         {
             var respData = new { id, value, error };
-            this.SendMessage("RESPONSE", respData);
+            this.SendMessage("RESPONSE", respData, urgent);
         }
 
-        public bool SendMessage(string msgType, object data = null)     
+        static JsonSerializer CreateSerializer()
         {
-            var message = new MessageToEngine(msgType, data);
             var settings = new JsonSerializerSettings() { ReferenceLoopHandling = ReferenceLoopHandling.Ignore };
             settings.Error = (serializer, err) => err.ErrorContext.Handled = true;
-            string msgStr = JsonConvert.SerializeObject(message, Formatting.None, settings);
-            this.NamedPipe.SendQueue.Add(msgStr);
+            return JsonSerializer.Create(settings);
+        }
+
+        public bool SendMessage(string msgType, object data = null, bool urgent = false)     
+        {
+            // every message carries the game tick it was produced on so the client can order and age values
+            var message = new MessageToEngine(msgType, data, Game1.ticks);
+            byte[] frame = this.NamedPipe.Codec.Encode(message, CreateSerializer());
+            (urgent ? this.NamedPipe.UrgentSendQueue : this.NamedPipe.SendQueue).Add(frame);
             return true;
         }
 
+        // Encodes a value on its own so it can be nested in a message and decoded by the client only if it's
+        // read. MessagePack nests it as binary, JSON as a string.
+        public object EncodePayload(object value)
+        {
+            var codec = this.NamedPipe.Codec;
+            byte[] encoded = codec.Encode(value, CreateSerializer());
+            return codec.Name == "json" ? Encoding.UTF8.GetString(encoded) : encoded;
+        }
+
+        public void SubscribeEvents(IEnumerable<string> eventTypes)
+        {
+            this.NamedPipe.SubscribedEvents = new HashSet<string>(eventTypes);
+        }
+
         public void SendEvent(string eventType, object data = null) {
+            var subscribed = this.NamedPipe.SubscribedEvents;
+            if (subscribed != null && !subscribed.Contains(eventType)) return;
             var msg = new { eventType, data };
             this.SendMessage("EVENT", msg);
         }
     }
 
-    public record MessageToEngine(string type, object data);
+    public record MessageToEngine(string type, object data, int tick);
 
     public record ResponseData(string id, object value);
 
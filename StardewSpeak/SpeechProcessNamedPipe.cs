@@ -19,13 +19,17 @@ namespace StardewSpeak
         readonly BinaryWriter Writer;
         readonly NamedPipeServerStream ReaderStream;
         readonly NamedPipeServerStream WriterStream;
-        readonly Action<string> OnMessage;
+        readonly Action<byte[]> OnMessage;
         public bool DoShutdown = false;
         bool ReadClosed = false;
         bool WriteClosed = false;
-        public BlockingCollection<string> SendQueue = new();
+        public BlockingCollection<byte[]> SendQueue = new();
+        public BlockingCollection<byte[]> UrgentSendQueue = new();
+        public IMessageCodec Codec = MessageCodec.Json;
+        // event types the client listens for, everything until it says otherwise
+        public volatile HashSet<string> SubscribedEvents = null;
         readonly CancellationTokenSource WriteCancel = new();
-        public SpeechProcessNamedPipe(Action<string> onMessage)
+        public SpeechProcessNamedPipe(Action<byte[]> onMessage)
         {
             this.OnMessage = onMessage;
             this.FileName = System.Guid.NewGuid().ToString();
@@ -45,7 +49,7 @@ namespace StardewSpeak
             {
                 try
                 {
-                    string msg = this.ReadNext();
+                    byte[] msg = this.ReadNext();
                     this.OnMessage(msg);
                 }
                 catch (EndOfStreamException)
@@ -61,12 +65,13 @@ namespace StardewSpeak
         void RunWriter(object state)
         {
             if (this.DoShutdown) return;
-            string next;
+            byte[] next;
             while (true)
             {
                 try
                 {
-                    next = this.SendQueue.Take(this.WriteCancel.Token);
+                    // TakeFromAny checks collections in order, so urgent frames jump ahead of queued bulk responses
+                    BlockingCollection<byte[]>.TakeFromAny(new[] { this.UrgentSendQueue, this.SendQueue }, out next, this.WriteCancel.Token);
                 }
                 catch (OperationCanceledException)
                 {
@@ -123,18 +128,18 @@ namespace StardewSpeak
         }
 
 
-        string ReadNext() 
+        byte[] ReadNext() 
         {
-            var len = (int)this.Reader.ReadUInt32();            // Read string length
-            var str = new string(this.Reader.ReadChars(len));    // Read string
-            return str;
+            var len = (int)this.Reader.ReadUInt32();            // Read frame length
+            var frame = this.Reader.ReadBytes(len);             // Read frame
+            if (frame.Length < len) throw new EndOfStreamException();
+            return frame;
         }
 
-        void SendMessage(string message) 
+        void SendMessage(byte[] frame) 
         {
-            var buf = Encoding.UTF8.GetBytes(message);     // Get ASCII byte array     
-            this.Writer.Write((uint)buf.Length);                // Write string length
-            this.Writer.Write(buf);
+            this.Writer.Write((uint)frame.Length);                // Write frame length
+            this.Writer.Write(frame);
         }
 
     }
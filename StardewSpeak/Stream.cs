@@ -1,4 +1,6 @@
 ﻿using Microsoft.Xna.Framework;
+using Newtonsoft.Json;
+using Newtonsoft.Json.Linq;
 using StardewModdingAPI.Events;
 using StardewValley;
 using System;
@@ -21,6 +23,97 @@ namespace StardewSpeak
             this.Id = id;
             this.Data = streamData;
         }
+
+        static readonly JsonSerializer DeltaSerializer = JsonSerializer.Create(
+            new JsonSerializerSettings() { ReferenceLoopHandling = ReferenceLoopHandling.Ignore });
+        JObject lastSent;
+        CollectionDelta collection;
+
+        public bool DeltaMode => this.Data is JObject data && data.Value<bool?>("delta") == true;
+        public bool CollectionMode => this.Data is JObject data && data.Value<bool?>("collection") == true;
+
+        // In delta mode only top-level fields that changed since the previous message are sent. In
+        // collection mode lists are sent as operations keyed by a stable identity. The pipe is ordered and
+        // the client keeps the last full value, so there's nothing to acknowledge.
+        public object NextValue(object value, out string deltaKind)
+        {
+            deltaKind = null;
+            if (this.CollectionMode)
+            {
+                string type = this.Data.type;
+                if (this.collection == null && CollectionDelta.ForRequestType(type) is CollectionDelta cd) this.collection = cd;
+                if (this.collection != null)
+                {
+                    var token = value == null ? JValue.CreateNull() : JToken.FromObject(value, DeltaSerializer);
+                    var ops = this.collection.Next(token);
+                    if (ops != null)
+                    {
+                        deltaKind = "collection";
+                        return ops;
+                    }
+                    return token;
+                }
+            }
+            if (!this.DeltaMode) return value;
+            var current = value == null ? null : JToken.FromObject(value, DeltaSerializer) as JObject;
+            var previous = this.lastSent;
+            this.lastSent = current;
+            if (current == null || previous == null || previous.Properties().Any(p => !current.ContainsKey(p.Name)))
+            {
+                return current ?? value;
+            }
+            deltaKind = "fields";
+            return ChangedFields(previous, current);
+        }
+
+        public bool ChangesOnly => this.Data is JObject data && data.Value<bool?>("changesOnly") == true;
+        public int HeartbeatTicks => this.Data is JObject data ? data.Value<int?>("heartbeat") ?? 0 : 0;
+        JToken lastChangeToken;
+        public JToken Until => this.Data is JObject data ? data["until"] : null;
+        bool untilMatched;
+        uint lastSentTick;
+
+        // Change-only streams skip values equal to the last one sent, apart from a heartbeat every
+        // HeartbeatTicks so the client can tell the stream is still alive.
+        public bool ShouldSkip(object value, string deltaKind, uint tick)
+        {
+            if (this.Until != null)
+            {
+                // one message when the predicate becomes true, nothing while it stays true
+                var token = value as JToken ?? (value == null ? JValue.CreateNull() : JToken.FromObject(value, DeltaSerializer));
+                bool matched = Predicate.Evaluate(this.Until, token);
+                bool skip = !matched || this.untilMatched;
+                this.untilMatched = matched;
+                return skip;
+            }
+            if (!this.ChangesOnly) return false;
+            bool unchanged;
+            if (deltaKind != null)
+            {
+                unchanged = ((JObject)value).Count == 0;
+            }
+            else
+            {
+                var token = value as JToken ?? (value == null ? JValue.CreateNull() : JToken.FromObject(value, DeltaSerializer));
+                unchanged = this.lastChangeToken != null && JToken.DeepEquals(token, this.lastChangeToken);
+                this.lastChangeToken = token;
+            }
+            if (unchanged && (this.HeartbeatTicks <= 0 || tick - this.lastSentTick < this.HeartbeatTicks)) return true;
+            this.lastSentTick = tick;
+            return false;
+        }
+
+        public static JObject ChangedFields(JObject previous, JObject current, string skip = null)
+        {
+            var changed = new JObject();
+            foreach (var prop in current.Properties())
+            {
+                if (prop.Name == skip) continue;
+                if (previous == null || !JToken.DeepEquals(prop.Value, previous[prop.Name])) changed[prop.Name] = prop.Value.DeepClone();
+            }
+            return changed;
+        }
+
         public static List<dynamic> MessageStreams(Dictionary<string, Stream> streams, string streamName, dynamic messageValue) 
         {
             var messages = new List<dynamic>();
@@ -39,4 +132,91 @@ namespace StardewSpeak
         }
 
     }
+
+    // Keeps the last list sent for a collection stream and turns the next one into upsert/remove operations
+    // keyed by a stable identity, plus the key order when it changes.
+    public class CollectionDelta
+    {
+        readonly string field; // null when the value itself is the list
+        readonly Func<JArray, List<string>> keysOf;
+        Dictionary<string, JToken> items;
+        List<string> order;
+        JObject fields;
+
+        public CollectionDelta(string field, Func<JArray, List<string>> keysOf)
+        {
+            this.field = field;
+            this.keysOf = keysOf;
+        }
+
+        public static CollectionDelta ForRequestType(string requestType)
+        {
+            switch (requestType)
+            {
+                case "CHARACTERS_AT_LOCATION":
+                    // monsters often share a name, so number repeats in list order
+                    return new CollectionDelta(null, list =>
+                    {
+                        var seen = new Dictionary<string, int>();
+                        return list.Select(x =>
+                        {
+                            string name = (string)x["name"];
+                            seen[name] = seen.TryGetValue(name, out int n) ? n + 1 : 1;
+                            return seen[name] == 1 ? name : $"{name}#{seen[name]}";
+                        }).ToList();
+                    });
+                case "ANIMALS_AT_LOCATION":
+                    return new CollectionDelta(null, list => list.Select(x => x["id"].ToString()).ToList());
+                case "PLAYER_ITEMS":
+                    return new CollectionDelta("items", list => Enumerable.Range(0, list.Count).Select(i => i.ToString()).ToList());
+            }
+            return null;
+        }
+
+        // Returns null when the value doesn't have the expected shape, it's then sent in full
+        public JObject Next(JToken value)
+        {
+            var container = this.field == null ? null : value as JObject;
+            var list = (this.field == null ? value : container?[this.field]) as JArray;
+            if (list == null)
+            {
+                this.items = null;
+                return null;
+            }
+            var keys = this.keysOf(list);
+            var ops = new JObject();
+            bool reset = this.items == null;
+            if (reset)
+            {
+                ops["reset"] = true;
+                ops["field"] = this.field;
+            }
+            var newItems = new Dictionary<string, JToken>();
+            var upsert = new JObject();
+            for (int i = 0; i < keys.Count; i++)
+            {
+                newItems[keys[i]] = list[i];
+                if (reset || !this.items.TryGetValue(keys[i], out JToken previous) || !JToken.DeepEquals(previous, list[i]))
+                {
+                    upsert[keys[i]] = list[i].DeepClone();
+                }
+            }
+            if (upsert.Count > 0) ops["upsert"] = upsert;
+            if (!reset)
+            {
+                var removed = this.items.Keys.Where(k => !newItems.ContainsKey(k)).ToList();
+                if (removed.Count > 0) ops["remove"] = new JArray(removed);
+            }
+            if (reset || !this.order.SequenceEqual(keys)) ops["order"] = new JArray(keys);
+            if (container != null)
+            {
+                var changedFields = Stream.ChangedFields(reset ? null : this.fields, container, skip: this.field);
+                if (changedFields.Count > 0) ops["fields"] = changedFields;
+            }
+            this.items = newItems;
+            this.order = keys;
+            this.fields = container;
+            return ops;
+        }
+    }
 }
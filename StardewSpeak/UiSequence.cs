@@ -0,0 +1,91 @@
+﻿using Newtonsoft.Json.Linq;
+using StardewValley;
+using System;
+using System.Collections.Generic;
+
+namespace StardewSpeak
+{
+    // An ordered list of mouse steps run by the mod across game ticks, so a scroll or a range of clicks is one
+    // request instead of one round trip per click. Each step waits its "ticks" before the next one runs and
+    // the client gets a single response once the last step is done.
+    public class UiSequence
+    {
+        public static readonly object Deferred = new();
+        static readonly List<UiSequence> Running = new();
+        static int lastRunTick = -1;
+
+        // the request's message id as received, the client matches the response on it unchanged
+        readonly object id;
+        readonly JArray steps;
+        int index = 0;
+        int nextStepTick = 0;
+
+        public UiSequence(object id, JArray steps)
+        {
+            this.id = id;
+            this.steps = steps;
+        }
+
+        public static object Start(object id, JArray steps)
+        {
+            Running.Add(new UiSequence(id, steps));
+            return Deferred;
+        }
+
+        // Advances every running sequence by one tick, at most once per game tick
+        public static void RunAll(Action<object, object, string> respond)
+        {
+            if (lastRunTick == Game1.ticks) return;
+            lastRunTick = Game1.ticks;
+            foreach (var sequence in Running.ToArray())
+            {
+                if (Requests.IsCancelled(sequence.id))
+                {
+                    Requests.Forget(sequence.id);
+                    Running.Remove(sequence);
+                    continue;
+                }
+                try
+                {
+                    if (!sequence.Run()) continue;
+                    respond(sequence.id, true, null);
+                }
+                catch (Exception e)
+                {
+                    respond(sequence.id, e.ToString(), "STACK_TRACE");
+                }
+                Running.Remove(sequence);
+            }
+        }
+
+        // Returns true when the last step is done
+        bool Run()
+        {
+            while (Game1.ticks >= this.nextStepTick)
+            {
+                if (this.index >= this.steps.Count) return true;
+                var step = (JObject)this.steps[this.index++];
+                RunStep(step);
+                this.nextStepTick = Game1.ticks + (step.Value<int?>("ticks") ?? 0);
+            }
+            return false;
+        }
+
+        static void RunStep(JObject step)
+        {
+            string action = (string)step["action"];
+            switch (action)
+            {
+                case "focus":
+                    Game1.setMousePosition((int)step["x"], (int)step["y"]);
+                    break;
+                case "click":
+                    if ((string)step["btn"] == "right") Input.RightClick();
+                    else Input.LeftClick();
+                    break;
+                default:
+                    throw new InvalidOperationException($"Unknown UI sequence step {action}");
+            }
+        }
+    }
+}
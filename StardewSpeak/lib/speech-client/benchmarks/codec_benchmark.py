@@ -0,0 +1,67 @@
+"""
+Compare encode/decode cost and frame size of the mod message codecs.
+
+Payloads are read from the debug directory, which the "game state write" command fills with recorded
+PLAYER_STATUS, GET_LOCATION_OBJECTS and GET_ACTIVE_MENU responses.
+
+    python benchmarks/codec_benchmark.py [--debug-dir DIR] [--number N]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+SPEECH_CLIENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "speech-client")
+sys.path.insert(0, SPEECH_CLIENT_DIR)
+
+import message_codec
+
+RECORDED_PAYLOADS = {
+    "PLAYER_STATUS": ("player_status.json", "STREAM_MESSAGE"),
+    "GET_LOCATION_OBJECTS": ("location_objects.json", "RESPONSE"),
+    "GET_ACTIVE_MENU": ("menu.json", "RESPONSE"),
+}
+
+
+def load_messages(debug_dir):
+    messages = {}
+    for name, (fname, msg_type) in RECORDED_PAYLOADS.items():
+        path = os.path.join(debug_dir, fname)
+        if not os.path.isfile(path):
+            print(f"Skipping {name}, no recording at {path}")
+            continue
+        with open(path) as f:
+            value = json.load(f)
+        if msg_type == "RESPONSE":
+            data = {"id": 12345, "value": value, "error": None}
+        else:
+            data = {"stream_id": "UPDATE_TICKED_42", "value": value, "error": None}
+        messages[name] = {"type": msg_type, "data": data}
+    return messages
+
+
+def bench(codec, msg, number):
+    frame = codec.encode(msg)
+    encode_time = timeit.timeit(lambda: codec.encode(msg), number=number) / number
+    decode_time = timeit.timeit(lambda: codec.decode(frame), number=number) / number
+    return len(frame), encode_time, decode_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug-dir", default=os.path.join(SPEECH_CLIENT_DIR, "..", "debug"))
+    parser.add_argument("--number", type=int, default=2000)
+    args = parser.parse_args()
+    messages = load_messages(args.debug_dir)
+    if not messages:
+        sys.exit('No recorded payloads found, run the "game state write" command first')
+    print(f"{'payload':<22}{'codec':<10}{'bytes':>10}{'encode us':>12}{'decode us':>12}")
+    for name, msg in messages.items():
+        for codec in message_codec.available_codecs.values():
+            size, encode_time, decode_time = bench(codec, msg, args.number)
+            print(f"{name:<22}{codec.name:<10}{size:>10}{encode_time * 1e6:>12.1f}{decode_time * 1e6:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Paths per second of the client side search in passability.py and how often it returns the same path as
+the mod's Pathfinder, and the time to pick the nearest reachable target with one find_goals search vs
+one find_path per target.
+
+Uses debug/pathfinding_*.json, recorded with the "game state record paths" command: the passability grid
+of a location and the mod's path from the player to random tiles, with the round trip time of each
+path_to_tile request. Without recordings a synthetic map is searched and only speed is reported.
+
+    python benchmarks/pathfinding_benchmark.py [--recordings GLOB] [--repeat N]
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+SPEECH_CLIENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "speech-client")
+sys.path.insert(0, SPEECH_CLIENT_DIR)
+
+import passability
+
+
+def synthetic_recording(width=80, height=65, blocked=0.25, count=200, seed=0):
+    rng = random.Random(seed)
+    grid_width, grid_height = width + 2, height + 2
+    bits = bytearray((grid_width * grid_height + 7) // 8)
+    walkable = []
+    for gy in range(grid_height):
+        for gx in range(grid_width):
+            x, y = gx - 1, gy - 1
+            on_map = 0 <= x < width and 0 <= y < height
+            if on_map and rng.random() >= blocked:
+                i = gy * grid_width + gx
+                bits[i >> 3] |= 1 << (i & 7)
+                walkable.append((x, y))
+    grid = {
+        "location": "Synthetic",
+        "mapWidth": width,
+        "mapHeight": height,
+        "originX": -1,
+        "originY": -1,
+        "width": grid_width,
+        "height": grid_height,
+        "tiles": base64.b64encode(bytes(bits)).decode(),
+    }
+    start = rng.choice(walkable)
+    paths = [{"end": end, "tiles": None, "seconds": None} for end in rng.sample(walkable, count)]
+    return {"grid": grid, "start": start, "paths": paths}
+
+
+def load_recording(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def run(name, recording, repeat):
+    grid = passability.PassabilityGrid(recording["grid"])
+    start = tuple(recording["start"])
+    queries = [(tuple(p["end"]), p["tiles"]) for p in recording["paths"]]
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = [passability.find_path(grid, start, end) for end, _ in queries]
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    compared = agreed = 0
+    for (end, mod_tiles), local in zip(queries, results):
+        if mod_tiles is None and all(p["tiles"] is None for p in recording["paths"]):
+            continue  # synthetic, nothing to compare with
+        compared += 1
+        mod_path = None if mod_tiles is None else [tuple(t) for t in mod_tiles]
+        agreed += mod_path == local
+    goals = [(end, False) for end, _ in queries]
+    started = time.perf_counter()
+    passability.find_goals(grid, start, goals)
+    goals_ms = (time.perf_counter() - started) * 1e3
+    mod_seconds = [p["seconds"] for p in recording["paths"] if p.get("seconds")]
+    local_rate = len(queries) / best
+    mod_rate = len(mod_seconds) / sum(mod_seconds) if mod_seconds else None
+    agreement = f"{agreed}/{compared}" if compared else "-"
+    mod_column = f"{mod_rate:>12.1f}" if mod_rate else f"{'-':>12}"
+    each_ms = best * 1e3
+    print(f"{name:<24}{len(queries):>8}{local_rate:>12.1f}{mod_column}{agreement:>12}{each_ms:>12.1f}{goals_ms:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    default_recordings = os.path.join(SPEECH_CLIENT_DIR, "..", "debug", "pathfinding_*.json")
+    parser.add_argument("--recordings", default=default_recordings)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    recordings = {os.path.basename(p): load_recording(p) for p in sorted(glob.glob(args.recordings))}
+    if not recordings:
+        recordings = {"synthetic 80x65": synthetic_recording()}
+    # mod paths/s is from the recorded path_to_tile round trips
+    # the last two columns are ms to search for every target, one at a time and all at once
+    print(f"{'map':<24}{'paths':>8}{'local/s':>12}{'mod/s':>12}{'agree':>12}{'each ms':>12}{'goals ms':>12}")
+    for name, recording in recordings.items():
+        run(name, recording, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Worst-case latency of the mod's reply to a stop (RELEASE_ALL_KEYS) when it's queued behind large
+object query responses that are still waiting to be written, with and without the urgent lane.
+
+Bulk data only flows from the mod to the client, so this models the mod's side of the pipe: the writer
+thread in SpeechProcessNamedPipe.RunWriter takes from UrgentSendQueue before SendQueue, one frame per
+write. Without the urgent lane every response goes through SendQueue in order. The pipe is simulated
+with a fixed bandwidth so the numbers reflect queueing, not the machine. Bulk frames are built from
+debug/location_objects.json when it exists (see "game state write").
+
+    python benchmarks/priority_benchmark.py [--debug-dir DIR] [--bandwidth-mb 50] [--bulk-frames 4]
+"""
+import argparse
+import json
+import os
+import queue
+import statistics
+import sys
+import threading
+import time
+
+SPEECH_CLIENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "speech-client")
+sys.path.insert(0, SPEECH_CLIENT_DIR)
+
+import message_codec
+
+STOP_RESPONSE = message_codec.JSON.encode({"type": "RESPONSE", "id": 1, "data": {"value": None, "error": None}})
+
+
+class ModWriter:
+    """SpeechProcessNamedPipe's writer thread on a pipe that writes bytes_per_second"""
+
+    def __init__(self, bytes_per_second):
+        self.bytes_per_second = bytes_per_second
+        self.send_queue = queue.Queue()
+        self.urgent_send_queue = queue.Queue()
+        self.ready = threading.Semaphore(0)
+        self.stop_written = threading.Event()
+        self.first_write = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def send(self, frame, urgent=False):
+        (self.urgent_send_queue if urgent else self.send_queue).put(frame)
+        self.ready.release()
+
+    def _take(self):
+        # BlockingCollection.TakeFromAny checks the collections in order
+        self.ready.acquire()
+        try:
+            return self.urgent_send_queue.get_nowait()
+        except queue.Empty:
+            return self.send_queue.get_nowait()
+
+    def _run(self):
+        while not self.stop_written.is_set():
+            frame = self._take()
+            self.first_write.set()
+            time.sleep((len(frame) + 4) / self.bytes_per_second)
+            if frame is STOP_RESPONSE:
+                self.stop_written.set()
+
+
+def bulk_frame(debug_dir):
+    path = os.path.join(debug_dir, "location_objects.json")
+    if os.path.isfile(path):
+        with open(path) as f:
+            objects = json.load(f)
+    else:
+        objects = [{"name": "Stone", "tileX": i % 80, "tileY": i // 80, "type": "Litter"} for i in range(2000)]
+    return message_codec.JSON.encode({"type": "RESPONSE", "id": 2, "data": {"value": objects, "error": None}})
+
+
+def stop_latency(bulk, bulk_frames, bandwidth, urgent):
+    writer = ModWriter(bandwidth)
+    for _ in range(bulk_frames):
+        writer.send(bulk)
+    writer.first_write.wait()  # first bulk frame is mid-write
+    start = time.perf_counter()
+    writer.send(STOP_RESPONSE, urgent=urgent)
+    writer.stop_written.wait()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--debug-dir", default=os.path.join(SPEECH_CLIENT_DIR, "..", "debug"))
+    parser.add_argument("--bandwidth-mb", type=float, default=50)
+    parser.add_argument("--bulk-frames", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    bulk = bulk_frame(args.debug_dir)
+    bandwidth = args.bandwidth_mb * 1e6
+    print(f"bulk response {len(bulk)} bytes x {args.bulk_frames}, simulated pipe {args.bandwidth_mb} MB/s")
+    for urgent in (False, True):
+        samples = [stop_latency(bulk, args.bulk_frames, bandwidth, urgent) for _ in range(args.repeat)]
+        lane = "urgent lane" if urgent else "fifo"
+        median_ms = statistics.median(samples) * 1000
+        max_ms = max(samples) * 1000
+        print(f"{lane:<12} stop response latency ms: median {median_ms:.1f} max {max_ms:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Memory and allocation cost of plain dicts vs the __slots__ records in records.py.
+
+- location objects: memory held by one cached GET_LOCATION_OBJECTS list
+- player status: bytes held and time spent decoding each PLAYER_STATUS tick, the value Path.travel reads
+  every tick while walking
+
+Player status values come from debug/player_status_session.jsonl (recorded with "game state record")
+when it exists, otherwise from a synthetic walk. Values are decoded from JSON each time, like they are
+off the pipe, so strings aren't shared unless they're interned.
+
+    python benchmarks/records_benchmark.py [--session FILE] [--objects N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+SPEECH_CLIENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "speech-client")
+sys.path.insert(0, SPEECH_CLIENT_DIR)
+
+import records
+
+OBJECT_NAMES = ("Stone", "Weeds", "Twig", "Chest", "Furnace", "Keg", "Preserves Jar", "Sprinkler")
+
+
+def synthetic_objects(count):
+    return [
+        {
+            "name": OBJECT_NAMES[i % len(OBJECT_NAMES)],
+            "tileX": i % 80,
+            "tileY": i // 80,
+            "type": "Crafting" if i % 3 else "Litter",
+            "isForage": False,
+            "readyForHarvest": i % 7 == 0,
+            "canBeGrabbed": False,
+            "isOnScreen": i % 2 == 0,
+            "parentSheetIndex": 450 + i % len(OBJECT_NAMES),
+            "category": -9,
+        }
+        for i in range(count)
+    ]
+
+
+def synthetic_walk(ticks):
+    statuses = []
+    for i in range(ticks):
+        x, y = 640.0 + i * 5.33, 1280.0
+        statuses.append(
+            {
+                "location": "Farm",
+                "position": [x, y],
+                "center": [int(x) + 32, int(y) + 32],
+                "tileX": int(x) // 64,
+                "tileY": int(y) // 64,
+                "canMove": True,
+                "facingDirection": 1,
+                "isMoving": True,
+                "lastWarp": None,
+                "currentEvent": None,
+            }
+        )
+    return statuses
+
+
+def load_session(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def retained_bytes(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    value = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del value
+    return after - before
+
+
+def bytes_per_tick(frames, decode, sample=200):
+    """Memory held by one decoded value, i.e. what each tick allocates and keeps until the next one"""
+    step = max(1, len(frames) // sample)
+    sizes = [retained_bytes(lambda: decode(frame)) for frame in frames[::step]]
+    return sum(sizes) / len(sizes)
+
+
+def seconds_per_tick(frames, decode, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for frame in frames:
+            decode(frame)
+        elapsed = (time.perf_counter() - start) / len(frames)
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    default_session = os.path.join(SPEECH_CLIENT_DIR, "..", "debug", "player_status_session.jsonl")
+    parser.add_argument("--session", default=default_session)
+    parser.add_argument("--objects", type=int, default=500)
+    args = parser.parse_args()
+
+    objects_frame = json.dumps(synthetic_objects(args.objects))
+    dict_size = retained_bytes(lambda: json.loads(objects_frame))
+    record_size = retained_bytes(lambda: records.from_wire("GET_LOCATION_OBJECTS", json.loads(objects_frame)))
+    print(f"GET_LOCATION_OBJECTS list of {args.objects}")
+    print(f"{'':<10}{'bytes':>12}{'B/object':>12}")
+    print(f"{'dict':<10}{dict_size:>12}{dict_size / args.objects:>12.1f}")
+    print(f"{'record':<10}{record_size:>12}{record_size / args.objects:>12.1f}")
+
+    if os.path.exists(args.session):
+        statuses, source = load_session(args.session), args.session
+    else:
+        statuses, source = synthetic_walk(3600), "synthetic walk"
+    frames = [json.dumps(s) for s in statuses]
+    decoders = {
+        "dict": json.loads,
+        "record": lambda frame: records.from_wire("PLAYER_STATUS", json.loads(frame)),
+    }
+    print(f"\nPLAYER_STATUS, {len(frames)} ticks from {source}")
+    print(f"{'':<10}{'B/tick':>10}{'us/tick':>10}")
+    for name, decode in decoders.items():
+        print(f"{name:<10}{bytes_per_tick(frames, decode):>10.1f}{seconds_per_tick(frames, decode) * 1e6:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
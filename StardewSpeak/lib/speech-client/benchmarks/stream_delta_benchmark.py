@@ -0,0 +1,75 @@
+"""
+Bytes per tick of a PLAYER_STATUS stream with full values vs delta mode, where the mod only sends
+top-level fields that changed since the previous tick.
+
+Uses debug/player_status_session.jsonl, recorded with the "game state record" command while walking
+around. The deltas are computed the same way as Stream.NextValue in the mod.
+
+    python benchmarks/stream_delta_benchmark.py [--session FILE]
+"""
+import argparse
+import json
+import os
+import sys
+
+SPEECH_CLIENT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "speech-client")
+sys.path.insert(0, SPEECH_CLIENT_DIR)
+
+import message_codec
+
+STREAM_ID = "UPDATE_TICKED_42"
+
+
+def load_session(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def delta_messages(values):
+    previous = None
+    for value in values:
+        if not isinstance(value, dict) or not isinstance(previous, dict) or previous.keys() - value.keys():
+            yield {"stream_id": STREAM_ID, "value": value, "error": None}
+        else:
+            changed = {k: v for k, v in value.items() if previous.get(k) != v}
+            yield {"stream_id": STREAM_ID, "value": changed, "error": None, "delta": "fields"}
+        previous = value
+
+
+def full_messages(values):
+    for value in values:
+        yield {"stream_id": STREAM_ID, "value": value, "error": None}
+
+
+def rebuild(messages):
+    latest = None
+    for data in messages:
+        latest = {**latest, **data["value"]} if data.get("delta") == "fields" else data["value"]
+        yield latest
+
+
+def bytes_per_tick(codec, messages):
+    total = sum(len(codec.encode({"type": "STREAM_MESSAGE", "data": data})) + 4 for data in messages)
+    return total / len(messages)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    default_session = os.path.join(SPEECH_CLIENT_DIR, "..", "debug", "player_status_session.jsonl")
+    parser.add_argument("--session", default=default_session)
+    args = parser.parse_args()
+    values = load_session(args.session)
+    if not values:
+        sys.exit(f"No recorded ticks in {args.session}")
+    full = list(full_messages(values))
+    delta = list(delta_messages(values))
+    assert list(rebuild(delta)) == values, "rebuilt values don't match the recording"
+    print(f"{len(values)} ticks from {args.session}")
+    print(f"{'codec':<10}{'full B/tick':>14}{'delta B/tick':>14}{'saved':>8}")
+    for codec in message_codec.available_codecs.values():
+        full_size, delta_size = bytes_per_tick(codec, full), bytes_per_tick(codec, delta)
+        print(f"{codec.name:<10}{full_size:>14.1f}{delta_size:>14.1f}{1 - delta_size / full_size:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
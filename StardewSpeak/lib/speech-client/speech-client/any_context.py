@@ -27,6 +27,8 @@ non_repeat_mapping = {
         game.move_mouse_in_direction, "mouse_directions", "positive_num"
     ),
     "game state write": df_utils.async_action(game.write_game_state),
+    "game state record": df_utils.async_action(game.record_game_state),
+    "game state record paths": df_utils.async_action(game.record_paths),
     "action": df_utils.async_action(game.press_key, constants.ACTION_BUTTON),
     "(escape | menu [open | close])": df_utils.async_action(game.press_key, constants.MENU_BUTTON),
     "(squat | kick hold)": df_utils.async_action(server.mouse_hold),
@@ -2,7 +2,7 @@ import asyncio
 import functools
 import dragonfly as df
 from srabuilder import rules
-import title_menu, menu_utils, server, df_utils, game, container_menu, objective, constants, carpenter_menu
+import title_menu, menu_utils, menu_layout, server, df_utils, game, container_menu, objective, constants, carpenter_menu
 
 
 def validate_any_menu(menu):
@@ -27,22 +27,19 @@ async def move_cursor_to_next_component(menu, direction, n=1):
     elif direction in (constants.SOUTHEAST, constants.SOUTHWEST):
         direction = constants.SOUTH
     
+    layout = menu_layout.layout(menu)
     for i in times:
         if i == 1:
             direction = second_direction
         else:
-            clickable = list(menu_utils.yield_clickable_components(menu))
-            for cmp in menu_utils.yield_clickable_components(menu):
-                center = cmp["center"]
-                if cmp["containsMouse"]:
-                    current_position = cmp
-                else:
-                    target_components.append(cmp)
+            current_position = layout.mouse_component
+            target_components = [cmp for cmp in layout.clickable if cmp is not current_position]
             if not target_components:
                 return
         if current_position is None:
             cx, cy = await server.get_mouse_position()
-            current_position = {"center": (cx, cy), 'visible': True}
+            # the snapshot may be older than the last mouse move
+            current_position = layout.component_at(cx, cy) or {"center": (cx, cy), 'visible': True}
         if direction == constants.NORTH:
             direction_index, multiplier = 1, -1
         elif direction == constants.EAST:
@@ -1,8 +1,10 @@
 import constants
+import request_cache
 import server
 import asyncio
 import inspect
 import collections
+import functools
 from dragonfly import  get_engine
 import dragonfly.engines.base.engine
 
@@ -30,34 +32,62 @@ async def on_game_event(data):
 
 event_registry = {
     "KEY_PRESSED": on_key_pressed,
-    "UPDATE_TICKING": lambda x: None,
-    "UPDATE_TICKED": lambda x: None,
     "SPEECH_MIMICKED": on_speech_mimicked,
     "SAVE_LOADED": on_save_loaded,
     "GAME_EVENT": on_game_event,
-    "TERRAIN_FEATURE_LIST_CHANGED": lambda x: None
 }
-event_futures = collections.defaultdict(lambda: server.loop.create_future())
+# event type -> futures of everyone waiting for the next one
+event_waiters = collections.defaultdict(set)
+# event types the mod was last told to send
+subscribed_events = None
 
 async def wait_for_update_ticking():
-    return
-    return wait_for_event('UPDATE_TICKING')
+    # the mod stamps messages with the tick they were produced on, so waiting for a later one means
+    # the game has run at least one update since
+    await server.wait_next_update()
     
 async def wait_for_update_ticked():
-    return
-    return wait_for_event('UPDATE_TICKED')
+    await server.wait_next_update()
     
 def wait_for_event(event_name: str):
-    return event_futures[event_name]
+    fut = server.loop.create_future()
+    event_waiters[event_name].add(fut)
+    fut.add_done_callback(functools.partial(forget_waiter, event_name))
+    update_subscriptions()
+    return fut
+
+def forget_waiter(event_name, fut):
+    waiters = event_waiters.get(event_name)
+    if waiters is not None:
+        waiters.discard(fut)
+        if not waiters:
+            del event_waiters[event_name]
+            update_subscriptions()
+
+def observed_events():
+    return set(event_registry) | set(event_waiters) | request_cache.trigger_events()
+
+def update_subscriptions():
+    # events nobody handles, waits for or invalidates cached requests with aren't sent by the mod at all
+    global subscribed_events
+    wanted = observed_events()
+    if wanted != subscribed_events:
+        subscribed_events = wanted
+        server.send_message("SUBSCRIBE_EVENTS", sorted(wanted))
 
 def handle_event(evt):
-    handler = event_registry.get(evt['eventType'])
-    assert handler
+    event_type = evt['eventType']
+    # drop cached query results before anything reacting to the event can read them
+    request_cache.invalidate(event_type)
+    handler = event_registry.get(event_type)
     if handler:
         if inspect.iscoroutinefunction(handler):
             server.call_soon(handler, evt['data'])
         else:
             handler(evt['data'])
-        fut = event_futures[evt['eventType']]
-        event_futures[evt['eventType']] = server.loop.create_future()
-        fut.set_result(evt['data'])
+    waiters = event_waiters.pop(event_type, None)
+    if waiters:
+        for fut in waiters:
+            if not fut.done():
+                fut.set_result(evt['data'])
+        update_subscriptions()
@@ -1,5 +1,6 @@
 import game, server, menu_utils, constants, df_utils
 import dragonfly as df
+from predicates import field
 
 FISHING_MENU = 'fishingMenu'
 
@@ -15,13 +16,13 @@ async def start_fishing():
 
 async def cast_fishing_rod(tss):
     async with game.press_and_release(constants.USE_TOOL_BUTTON):
-        await tss.wait(lambda t: t['isTimingCast'] and t['castingPower'] > 0.95, timeout=10)
+        await tss.wait(field('isTimingCast') & (field('castingPower') > 0.95), timeout=10)
 
 async def wait_for_nibble(tss):
-    tool_status = await tss.wait(lambda t: t['isNibbling'] or not t['inUse'])
+    tool_status = await tss.wait(field('isNibbling') | ~field('inUse'))
     if tool_status['inUse']:
         await game.press_key(constants.USE_TOOL_BUTTON)
-        await tss.wait(lambda t: t['isReeling'])
+        await tss.wait(field('isReeling'))
 
 mapping = {
     "fish catch": df_utils.async_action(catch_fish)
@@ -7,7 +7,7 @@ import json
 import collections
 import contextlib
 import asyncio
-import server, constants, async_timeout, events
+import server, constants, async_timeout, events, metrics, records, pathfinding, passability
 
 last_faced_east_west = constants.WEST
 last_faced_north_south = constants.SOUTH
@@ -60,6 +60,9 @@ context_variables = {
     "ACTIVE_MENU": None,
     "GAME_EVENT": None,
 }
+# mod menu tracker revision and content hash of the ACTIVE_MENU snapshot
+active_menu_revision = None
+active_menu_hash = None
 
 
 async def update_held_buttons(to_hold=(), to_release=()):
@@ -85,7 +88,8 @@ class Path:
         tiles = []
         self.tile_indices = {}
         for i, mod_tile in enumerate(mod_path):
-            tile = (mod_tile["X"], mod_tile["Y"])
+            # (x, y) from a local search or {"X": x, "Y": y} from the mod
+            tile = mod_tile if isinstance(mod_tile, tuple) else (mod_tile["X"], mod_tile["Y"])
             tiles.append(tile)
             self.tile_indices[tile] = i
         self.tiles = tuple(tiles)
@@ -124,6 +128,8 @@ class Path:
                 except KeyError as e:
                     target_x, target_y = self.tiles[-1]  # target can change so check whenever we need a new path
                     current_tiles = self.tiles
+                    # off the path, likely pushed aside by a character, so search with what's blocking now
+                    pathfinding.forget_grid()
                     new_path = await path_to_tile(target_x, target_y, self.location)
                     if current_tiles == self.tiles:
                         self.retarget(new_path)
@@ -218,7 +224,7 @@ async def get_hoe_dirt(location: str):
 
 
 async def get_location_objects(location: str):
-    objects = await server.request(constants.GET_LOCATION_OBJECTS, {"location": location})
+    objects = await server.request(constants.GET_LOCATION_OBJECTS, {"location": location}, single_flight=True)
     return objects or []
 
 
@@ -344,6 +350,15 @@ async def path_to_next_location(next_location: str, status_stream):
     connections = await get_location_connections()
     connection_to_next_loc = [c for c in connections if c["TargetName"] == next_location]
     current_tile = await get_current_tile(status_stream)
+    goals = [((cn["X"], cn["Y"]), cn["IsDoor"]) for cn in connection_to_next_loc]
+    found = await pathfinding.nearest_goals(location, current_tile, goals)
+    if found is not pathfinding.NO_GRID:
+        if not found:
+            raise NavigationFailed(f"Cannot pathfind from {location} to {next_location}")
+        (tile, is_door), tiles = found[0]
+        path = Path(tiles, location)
+        door_direction = direction_from_tiles(path.tiles[-1], tile) if is_door else None
+        return path, door_direction
     connection_to_next_loc.sort(key=lambda cn: distance_between_points(current_tile, (cn["X"], cn["Y"])))
     for lc in connection_to_next_loc:
         x, y, is_door = lc["X"], lc["Y"], lc["IsDoor"]
@@ -361,14 +376,25 @@ async def path_to_next_location(next_location: str, status_stream):
 
 
 async def path_to_tile(x, y, location, cutoff=-1):
-    path = await server.request("path_to_tile", {"x": x, "y": y, "location": location, "cutoff": cutoff})
+    path = await pathfinding.path_from_player((x, y), location, cutoff=cutoff)
+    if path is pathfinding.NO_GRID:
+        path = await server.request("path_to_tile", {"x": x, "y": y, "location": location, "cutoff": cutoff})
     if path is None:
         raise NavigationFailed(f"Cannot pathfind to {x}, {y} at location {location}")
     return Path(path, location)
 
 
+async def request_path_to_player(x, y, cutoff=-1):
+    """Tiles from x, y to the player and the player's location"""
+    resp = await pathfinding.path_to_player((x, y), cutoff=cutoff)
+    if resp is pathfinding.NO_GRID:
+        resp = await server.request("PATH_TO_PLAYER", {"x": x, "y": y, "cutoff": cutoff})
+        resp = resp["tiles"], resp["location"]
+    return resp
+
+
 async def path_to_player(x, y, location, cutoff=-1):
-    path = await server.request("PATH_TO_PLAYER", {"x": x, "y": y, "location": location, "cutoff": cutoff})
+    path, _ = await request_path_to_player(x, y, cutoff=cutoff)
     if path is None:
         raise NavigationFailed(f"Cannot pathfind to player from {x}, {y} at location {location}")
     return Path(reversed(path), location)
@@ -388,8 +414,7 @@ def get_adjacent_tiles(tile):
 
 
 async def path_to_adjacent(x, y, tiles_from_target=1, cutoff=-1):
-    resp = await server.request("PATH_TO_PLAYER", {"x": x, "y": y, "cutoff": cutoff})
-    tiles, location = resp["tiles"], resp["location"]
+    tiles, location = await request_path_to_player(x, y, cutoff=cutoff)
     if tiles is None:
         raise NavigationFailed(f"Cannot pathfind to player from {x}, {y} at location {location}")
     return tiles_to_adjacent_path(tiles, location, tiles_from_target=tiles_from_target)
@@ -493,7 +518,7 @@ async def ensure_not_moving():
 
 async def face_direction(direction: int, stream: server.Stream, move_cursor=False):
     await ensure_not_moving()
-    status = await server.request("PLAYER_STATUS")
+    status = await server.request("PLAYER_STATUS", single_flight=True)
     
     direction_8 = direction
     if direction_8 in (constants.NORTHEAST, constants.NORTHWEST):
@@ -503,12 +528,14 @@ async def face_direction(direction: int, stream: server.Stream, move_cursor=Fals
     
     if status["facingDirection"] != direction:
         btn = directions_to_buttons[direction]
-        await press_key(btn)
-        try:
-            await stream.wait(lambda s: s["facingDirection"] == direction, timeout=0.1)
-        except asyncio.TimeoutError:
-            async with press_and_release(btn):
-                await stream.wait(lambda s: s["facingDirection"] == direction, timeout=5)
+        # player is standing still, so a change-only stream only wakes up once facing changes
+        async with server.player_status_stream(changes_only=True) as facing_stream:
+            await press_key(btn)
+            try:
+                await facing_stream.wait(lambda s: s["facingDirection"] == direction, timeout=0.1)
+            except asyncio.TimeoutError:
+                async with press_and_release(btn):
+                    await facing_stream.wait(lambda s: s["facingDirection"] == direction, timeout=5)
     if move_cursor:
         player_status = await stream.next()
         current_tile = player_status["tileX"], player_status["tileY"]
@@ -524,8 +551,8 @@ async def equip_item(predicate):
     matched_index = None
     row_size = 12
     with server.player_items_stream() as stream, server.async_timeout.timeout(5):
+        items_info = await stream.current()
         while True:
-            items_info = await stream.next()
             items = items_info["items"]
             for idx, inventory_item in enumerate(items):
                 if inventory_item and predicate(inventory_item):
@@ -538,7 +565,7 @@ async def equip_item(predicate):
                     return True
                 if matched_index >= row_size:
                     await press_key(constants.TOOLBAR_SWAP)
-                    await asyncio.sleep(0.1)
+                    items_info = await stream.current(newer_than=server.current_tick)
                 else:
                     await equip_item_by_index(matched_index)
                     return True
@@ -602,8 +629,8 @@ def next_hoe_key(start_tile, current_tile, target_tile, player_status):
 
 async def get_tools():
     tools = {}
-    async with server.player_items_stream(ticks=10) as stream:
-        items_info = await stream.next()
+    async with server.player_items_stream() as stream:
+        items_info = await stream.current()
         items = items_info["items"]
         for item in items:
             if item and item["isTool"]:
@@ -612,7 +639,7 @@ async def get_tools():
 
 
 async def swing_tool():
-    with server.tool_status_stream(ticks=1) as tss:
+    with server.tool_status_stream(ticks=1, changes_only=True) as tss:
         async with press_and_release(constants.USE_TOOL_BUTTON):
             await tss.wait(lambda t: t["inUse"], timeout=1)
         await tss.wait(lambda t: not t["inUse"], timeout=10)
@@ -633,6 +660,34 @@ async def pathfind_to_adjacent_tile_from_current(stream):
     raise NavigationFailed
 
 
+async def reachable_items(items, current_tile, location, pathfind_fn, order_by_path=False):
+    """
+    (item, path) for the items pathfind_fn can reach, with one search for all of them when the grid allows
+    it. The path is the search's tiles from current_tile, or None if pathfind_fn has to find it.
+    """
+    if pathfind_fn not in (pathfind_to_adjacent, pathfind_to_tile):
+        return [(item, None) for item in items]
+    adjacent = pathfind_fn is pathfind_to_adjacent
+    goals = [((item["tileX"], item["tileY"]), adjacent) for item in items]
+    found = await pathfinding.nearest_goals(location, current_tile, goals)
+    if found is pathfinding.NO_GRID:
+        return [(item, None) for item in items]
+    paths = dict(found)
+    reachable = [(item, paths[goal]) for item, goal in zip(items, goals) if goal in paths]
+    if order_by_path:
+        reachable.sort(key=lambda pair: len(pair[1]))
+    return reachable
+
+
+async def travel_found_path(tiles, location, target, stream):
+    """Travel a path from reachable_items, then face target if the path ends next to it like pathfind_to_adjacent"""
+    path = Path(tiles, location)
+    await path.travel(stream)
+    if path.tiles[-1] != target:
+        await face_direction(direction_from_tiles(path.tiles[-1], target), stream)
+    return path
+
+
 async def navigate_tiles(
     get_items,
     sort_items=generic_next_item_key,
@@ -640,6 +695,7 @@ async def navigate_tiles(
     items_ok=lambda prev, curr: True,
     allow_action_on_same_tile=True,
     index=None,
+    order_by_path=False,
 ):
     import events
 
@@ -653,21 +709,35 @@ async def navigate_tiles(
             if not items:
                 return
             sorted_items = sorted(items, key=lambda t: sort_items(start_tile, current_tile, t, player_status))
+            location = player_status["location"]
+            reachable = await reachable_items(
+                sorted_items, current_tile, location, pathfind_fn, order_by_path=order_by_path
+            )
+            if not reachable:
+                return
             if index is not None:
-                sorted_items = [sorted_items[index]]
+                if not -len(reachable) <= index < len(reachable):
+                    raise NavigationFailed(f"No reachable item at index {index}, {len(reachable)} reachable")
+                reachable = [reachable[index]]
             if not items_ok(previous_items, items):
                 raise RuntimeError("Unable to modify current tile")
-            previous_items = sorted_items
+            previous_items = [item for item, _ in reachable]
             item_path = None
-            for item in sorted_items:
+            # searched paths start where the player stood, only good until the player has moved
+            moved = False
+            for item, found_path in reachable:
                 item_tile = (item["tileX"], item["tileY"])
                 if current_tile == item_tile and not allow_action_on_same_tile:
                     await pathfind_to_adjacent_tile_from_current(stream)
                     await face_tile(stream, item_tile)
+                    moved = True
                 try:
-                    item_path = await pathfind_fn(item["tileX"], item["tileY"], stream)
+                    if found_path is None or moved:
+                        item_path = await pathfind_fn(item["tileX"], item["tileY"], stream)
+                    else:
+                        item_path = await travel_found_path(found_path, location, item_tile, stream)
                 except NavigationFailed:
-                    pass
+                    moved = True
                 else:
                     await set_mouse_position_on_tile(item_tile)
                     yield item
@@ -678,7 +748,9 @@ async def navigate_tiles(
 
 
 async def navigate_nearest_tile(get_items, pathfind_fn=pathfind_to_adjacent, index=None):
-    async for item in navigate_tiles(get_items, sort_items=closest_item_key, pathfind_fn=pathfind_fn, index=index):
+    async for item in navigate_tiles(
+        get_items, sort_items=closest_item_key, pathfind_fn=pathfind_fn, index=index, order_by_path=True
+    ):
         return item
     raise NavigationFailed
 
@@ -760,12 +832,50 @@ async def refill_watering_can():
 async def write_game_state():
     import menu_utils
 
+    player_status = await get_player_status()
+    log(player_status, "player_status.json")
     objs = await get_location_objects("")
     log(objs, "location_objects.json")
     hdt = await get_hoe_dirt("")
     log(hdt, "hoe_dirt.json")
     menu = await menu_utils.get_active_menu()
     log(menu, "menu.json")
+    log(metrics.snapshot(), "client_metrics.json")
+
+
+async def record_game_state(seconds=30):
+    # full PLAYER_STATUS value for every tick, e.g. while walking around, for benchmarks/stream_delta_benchmark.py
+    values = []
+    with server.player_status_stream(delta=False) as stream:
+        with contextlib.suppress(asyncio.TimeoutError):
+            async with async_timeout.timeout(seconds):
+                while True:
+                    values.append(await stream.next())
+    log("".join(json.dumps(v, default=records.json_default) + "\n" for v in values), "player_status_session.jsonl")
+    server.log(f"Recorded {len(values)} player status ticks")
+
+
+async def record_paths(count=200):
+    # the passability grid and the mod's paths to random tiles from where the player stands, with the round
+    # trip time of each, for benchmarks/pathfinding_benchmark.py
+    import random
+
+    grid_value = await server.request(pathfinding.GRID_REQUEST, use_cache=False)
+    grid = passability.PassabilityGrid(grid_value)
+    location, start = await pathfinding.player_tile()
+    walkable = [
+        (x, y) for x in range(grid.map_width) for y in range(grid.map_height) if grid.is_walkable(x, y)
+    ]
+    paths = []
+    for end in random.sample(walkable, min(count, len(walkable))):
+        started = time.perf_counter()
+        tiles = await server.request("path_to_tile", {"x": end[0], "y": end[1], "location": location, "cutoff": -1})
+        seconds = time.perf_counter() - started
+        tiles = None if tiles is None else [(t["X"], t["Y"]) for t in tiles]
+        paths.append({"end": end, "tiles": tiles, "seconds": seconds})
+    recording = {"grid": grid_value, "start": start, "paths": paths}
+    log(recording, f"pathfinding_{location}.json")
+    server.log(f"Recorded {len(paths)} paths at {location}")
 
 
 async def get_ready_crafted(loc):
@@ -876,8 +986,16 @@ def set_context_value(key, val):
     context_variables[key] = val
 
 
-def set_context_menu(menu):
+def set_context_menu(menu, revision=None, menu_hash=None):
+    import menu_layout
+
+    global active_menu_revision, active_menu_hash
     context_variables["ACTIVE_MENU"] = menu
+    if menu is not None:
+        # index the snapshot once when it arrives rather than on every command
+        menu_layout.layout(menu)
+    active_menu_revision = revision
+    active_menu_hash = menu_hash
 
 
 def get_context_menu(menu_type=None):
@@ -924,15 +1042,15 @@ async def go_outside():
 
 
 async def get_animals(animals_stream, player_stream):
-    animals, player_status = await asyncio.gather(animals_stream.next(), player_stream.next())
+    # the animals list is the stream's local mirror, don't sort it in place
+    animals, player_status = await asyncio.gather(animals_stream.current(), player_stream.current())
     player_tile = player_status["tileX"], player_status["tileY"]
-    animals.sort(key=lambda x: distance_between_points(player_tile, (x["tileX"], x["tileY"])))
-    return animals
+    return sorted(animals, key=lambda x: distance_between_points(player_tile, (x["tileX"], x["tileY"])))
 
 
 async def use_tool_on_animal_by_name(name: str):
     did_use = await server.request("USE_TOOL_ON_ANIMAL_BY_NAME", {"name": name})
-    async with server.tool_status_stream() as tss:
+    async with server.tool_status_stream(changes_only=True) as tss:
         await tss.wait(lambda t: not t["inUse"])
     return did_use
 
@@ -945,7 +1063,7 @@ def log(obj, name):
         if isinstance(obj, str):
             f.write(obj)
         else:
-            json.dump(obj, f, indent=4)
+            json.dump(obj, f, indent=4, default=records.json_default)
 
 
 async def pet_animal_by_name(name: str):
@@ -973,7 +1091,8 @@ class MoveToCharacter:
                     path = tiles_to_adjacent_path(
                         npc["pathTiles"], npc["location"], tiles_from_target=tiles_from_target
                     )
-                    # don't share streams between tasks, otherwise they steal .next() from each other and cause resource starvation issues
+                    # don't share a Stream object between tasks, otherwise they steal .next() from each other. Separate
+                    # streams with the same subscription share one mod-side stream but each keep their own cursor
                     pathfind_coro = path.travel(travel_path_stream)
                     pathfind_task_wrapper = objective.active_objective.add_task(pathfind_coro)
                     while not pathfind_task_wrapper.done:
@@ -1084,7 +1203,7 @@ async def move_n_tiles(direction: int, n: int, stream):
 
 async def get_player_status():
     req_builder = server.RequestBuilder("PLAYER_STATUS")
-    status = await req_builder.request()
+    status = await req_builder.request(single_flight=True)
     return status
 
 
@@ -0,0 +1,124 @@
+"""
+Layout model of a serialized menu snapshot, built once per snapshot instead of on every command: the
+visible clickable components, row/column grids of component lists, lookups by field and a spatial index
+for hit-testing.
+
+Snapshots are never modified after they arrive, so everything is cached by the identity of the menu
+or component list it was built from.
+
+Used wherever a command searches the menu: any_menu, menu_utils (field lookups, inventory grids, so
+every module going through find_component_by_field or InventoryMenuWrapper) and shop_menu. The other
+menu modules only index named components, e.g. menu["okButton"], and have nothing to search.
+"""
+import collections
+
+MAX_CACHED = 32
+CELL_SIZE = 64  # spatial index bucket size in pixels
+ROW_THRESHOLD = 25
+
+
+def yield_clickable_components(item):
+    if isinstance(item, dict):
+        if item.get("type") == "clickableComponent":
+            if item["visible"]:
+                yield item
+        else:
+            for child in item.values():
+                yield from yield_clickable_components(child)
+    if isinstance(item, (list, tuple)):
+        for child in item:
+            yield from yield_clickable_components(child)
+
+
+def list_of_rows(cmps, y_threshold=ROW_THRESHOLD):
+    """
+    Use center y property to create a list of rows from top to bottom. Assumes all items in a row
+    have the same y value
+    """
+    if not cmps:
+        return []
+    y_sorted = sorted(cmps, key=lambda c: c["center"][1])
+    rows = [[y_sorted[0]]]
+    for cmp in y_sorted[1:]:
+        cmp_y = cmp["center"][1]
+        first_in_row_y = rows[-1][0]["center"][1]
+        new_row = cmp_y >= first_in_row_y + y_threshold
+        if new_row:
+            rows.append([])
+        rows[-1].append(cmp)
+    return rows
+
+
+class Grid:
+    """Components of one list arranged in rows by their center y"""
+
+    def __init__(self, cmps):
+        self.rows = list_of_rows(cmps)
+        self.mouse_index = None
+        for row_num, row in enumerate(self.rows):
+            for col_num, cmp in enumerate(row):
+                if cmp["containsMouse"] and self.mouse_index is None:
+                    self.mouse_index = row_num, col_num
+
+    def __getitem__(self, row):
+        return self.rows[row]
+
+
+class MenuLayout:
+    def __init__(self, menu):
+        self.menu = menu
+        self.clickable = list(yield_clickable_components(menu))
+        self.mouse_component = next((c for c in self.clickable if c["containsMouse"]), None)
+        self.cells = collections.defaultdict(list)
+        for cmp in self.clickable:
+            bounds = cmp["bounds"]
+            x0, y0 = bounds["x"] // CELL_SIZE, bounds["y"] // CELL_SIZE
+            x1 = (bounds["x"] + max(bounds["width"] - 1, 0)) // CELL_SIZE
+            y1 = (bounds["y"] + max(bounds["height"] - 1, 0)) // CELL_SIZE
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    self.cells[(cx, cy)].append(cmp)
+
+    def component_at(self, x, y):
+        """Topmost visible clickable component whose bounds contain the point"""
+        for cmp in reversed(self.cells.get((x // CELL_SIZE, y // CELL_SIZE), ())):
+            bounds = cmp["bounds"]
+            if bounds["x"] <= x < bounds["x"] + bounds["width"] and bounds["y"] <= y < bounds["y"] + bounds["height"]:
+                return cmp
+        return None
+
+
+_cache = collections.OrderedDict()  # (kind, id(source)) -> (source, built), source kept alive so ids stay unique
+
+
+def _cached(kind, source, build):
+    key = kind, id(source)
+    hit = _cache.get(key)
+    if hit is not None and hit[0] is source:
+        _cache.move_to_end(key)
+        return hit[1]
+    built = build(source)
+    _cache[key] = source, built
+    while len(_cache) > MAX_CACHED:
+        _cache.popitem(last=False)
+    return built
+
+
+def layout(menu):
+    return _cached("layout", menu, MenuLayout)
+
+
+def grid(cmps):
+    return _cached("grid", cmps, Grid)
+
+
+def index_by(cmps, field):
+    """First component in the list for each value of `field`"""
+
+    def build(cmps):
+        index = {}
+        for cmp in cmps:
+            index.setdefault(cmp.get(field), cmp)
+        return index
+
+    return _cached(("index", field), cmps, build)
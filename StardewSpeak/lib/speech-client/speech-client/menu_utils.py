@@ -1,43 +1,28 @@
 import dragonfly as df
-import server, constants
-import asyncio
+import server, constants, metrics, menu_layout
 import functools
 import inspect
+import time
 
 MENU_GRAMMAR_COUNT = 0
+# game ticks between arrow clicks so each one registers as a separate press
+SCROLL_INTERVAL_TICKS = 3
 
 async def focus_component(cmp):
+    x, y = focus_target(cmp)
+    await server.set_mouse_position(x, y)
+
+def focus_target(cmp):
     if not cmp['visible']:
         raise InvalidMenuOption('Cannot focus non-visible component')   
-    x, y = cmp.get('focusTarget', cmp['center'])
-    await server.set_mouse_position(x, y)
+    return cmp.get('focusTarget', cmp['center'])
 
-def find_component_containing_mouse(list_of_cmp_rows):
-    for row_num, row in enumerate(list_of_cmp_rows):
-        for col_num, cmp in enumerate(row):
-            if cmp['containsMouse']:
-                return row_num, col_num
-
-def list_of_rows(cmps, y_threshold=25):
-    '''
-    Use center y property to create a list of rows from top to bottom. Assumes all items in a row
-    have the same y value
-    '''
-    if not cmps:
-        return []
-    y_sorted = sorted(cmps, key=lambda c: c['center'][1])
-    rows = [[y_sorted[0]]]
-    for cmp in y_sorted[1:]:
-        cmp_y = cmp['center'][1]
-        first_in_row_y = rows[-1][0]['center'][1]
-        new_row = cmp_y >= first_in_row_y + y_threshold
-        if new_row:
-            rows.append([])
-        rows[-1].append(cmp)
-    return rows
+def click_steps(cmp, ticks=0):
+    x, y = focus_target(cmp)
+    return [server.focus_step(x, y), server.click_step(ticks=ticks)]
 
 async def get_active_menu(menu_type=None):
-    menu = await server.request('GET_ACTIVE_MENU')
+    menu = await server.request('GET_ACTIVE_MENU', single_flight=True)
     if menu_type is not None:
         if menu is None:
             raise InvalidMenuOption(f'Expecting {menu_type}, got None')
@@ -46,6 +31,22 @@ async def get_active_menu(menu_type=None):
     return menu
 
 
+async def get_current_menu():
+    # The ACTIVE_MENU snapshot when the mod says its revision is still current, a much smaller round trip
+    # than serializing the whole menu again. Returns the menu and whether the snapshot was reused.
+    import game
+    menu, revision = game.context_variables["ACTIVE_MENU"], game.active_menu_revision
+    if revision is not None and await server.request("IS_MENU_REVISION_CURRENT", {"revision": revision}):
+        metrics.incr("menu.snapshot.reused")
+        return menu, True
+    metrics.incr("menu.snapshot.fetched")
+    # keep the client's copy and revision up to date too, so the next command can reuse it. This goes through
+    # the same path as a pushed change, which is skipped once the client has the new hash.
+    snapshot = await server.request("GET_MENU_SNAPSHOT", single_flight=True)
+    await server.update_context_menu(snapshot)
+    return snapshot["menu"], False
+
+
 async def click_menu_button(button_property, menu_getter=get_active_menu):
     menu = await menu_getter()
     if menu is None:
@@ -56,23 +57,19 @@ async def click_menu_button(button_property, menu_getter=get_active_menu):
     await click_component(btn)
 
 def find_component_by_field(list_of_components, field_name, field_value):
-    return next((x for x in list_of_components if x.get(field_name) == field_value), None)
+    return menu_layout.index_by(list_of_components, field_name).get(field_value)
 
 async def click_component(cmp):
     await focus_component(cmp)
     await server.mouse_click()
 
 async def scroll_up(menu, count=1):
-    cmp = menu[constants.UP_ARROW]
-    for i in range(count):
-        await click_component(cmp)
-        await asyncio.sleep(0.05)
+    steps = click_steps(menu[constants.UP_ARROW], ticks=SCROLL_INTERVAL_TICKS)
+    await server.ui_sequence(steps * count)
 
 async def scroll_down(menu, count=1):
-    cmp = menu[constants.DOWN_ARROW]
-    for i in range(count):
-        await click_component(cmp)
-        await asyncio.sleep(0.05)
+    steps = click_steps(menu[constants.DOWN_ARROW], ticks=SCROLL_INTERVAL_TICKS)
+    await server.ui_sequence(steps * count)
 
 async def try_menus(try_fns, *a):
     for fn in try_fns:
@@ -103,11 +100,11 @@ class InventoryMenuWrapper:
         await self.focus_box(inventory_menu, self.row, self.col)
 
     async def focus_box(self, inventory_menu, new_row, new_col):
-        rows = list_of_rows(inventory_menu['inventory'])
-        indices = find_component_containing_mouse(rows) or (self.row, self.col)
+        grid = menu_layout.grid(inventory_menu['inventory'])
+        indices = grid.mouse_index or (self.row, self.col)
         row = indices[0] if new_row is None else new_row
         col = indices[1] if new_col is None else new_col
-        cmp = rows[row][col]
+        cmp = grid[row][col]
         await focus_component(cmp)
         self.row = row
         self.col = col
@@ -116,11 +113,12 @@ class InventoryMenuWrapper:
         end = start if end is None else end
         if not (start <= end < 12):
             raise ValueError
-        rows = list_of_rows(inventory_menu['inventory'])
-        row, _ = find_component_containing_mouse(rows) or (self.row, self.col)
+        grid = menu_layout.grid(inventory_menu['inventory'])
+        row, _ = grid.mouse_index or (self.row, self.col)
+        steps = []
         for col in range(start, end + 1):
-            cmp = rows[row][col]
-            await click_component(cmp)
+            steps.extend(click_steps(grid[row][col], ticks=1))
+        await server.ui_sequence(steps)
         self.row = row
         self.col = end
 
@@ -140,19 +138,6 @@ def scroll_commands(page_size=4):
 class InvalidMenuOption(Exception):
     pass
 
-def yield_clickable_components(item):
-    if isinstance(item, dict):
-        if item.get('type') == 'clickableComponent':
-            if item['visible']:
-                yield item
-        else:
-            menu_type = item.get('menuType')
-            for child in item.values():
-                yield from yield_clickable_components(child)
-    if isinstance(item, (list, tuple)):
-        for child in item:
-            yield from yield_clickable_components(child)
-
 def inventory_commands():
     import df_utils
     inventory_wrapper = InventoryMenuWrapper()
@@ -230,7 +215,10 @@ class MenuGrammarBuilder:
 
     def format_args_menu_provider(self, old_format_args):
         async def format_args_with_menu(**kw):
-            menu = await self.get_menu()
+            start = time.perf_counter()
+            menu, reused = await self.get_menu()
+            # time from the command being recognized until there's a menu to click on
+            metrics.record_time(f"menu.command.latency.{'reused' if reused else 'fetched'}", time.perf_counter() - start)
             old_args = await ensure_awaited(old_format_args(**kw))
             return [menu] + old_args
         return format_args_with_menu
@@ -241,11 +229,11 @@ class MenuGrammarBuilder:
         return self.run_menu_validator(menu)
     
     async def get_menu(self):
-        menu = await get_active_menu()
+        menu, reused = await get_current_menu()
         res = self.test_validator(menu)
         if res is False:
             raise InvalidMenuOption()
-        return res or menu
+        return res or menu, reused
 
     @property
     def test_validator(self):
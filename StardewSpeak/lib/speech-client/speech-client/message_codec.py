@@ -0,0 +1,68 @@
+"""
+Wire encodings for messages sent over the mod named pipe. Every frame is a length-prefixed blob; the
+blob itself is either JSON or MessagePack. JSON frames always start with "{" while MessagePack maps
+never do, so frames can be decoded without knowing which codec the sender picked.
+"""
+import json
+
+import records
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class JsonCodec:
+    name = "json"
+
+    def encode(self, msg):
+        return json.dumps(msg, separators=(",", ":"), default=records.json_default).encode("utf8")
+
+    def decode(self, frame):
+        return json.loads(frame)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+
+    def encode(self, msg):
+        return msgpack.packb(msg, use_bin_type=True, default=records.json_default)
+
+    def decode(self, frame):
+        return msgpack.unpackb(frame, raw=False)
+
+
+JSON = JsonCodec()
+MSGPACK = MsgpackCodec() if msgpack is not None else None
+
+# Most preferred first. The mod picks the first one it also supports.
+available_codecs = {c.name: c for c in (MSGPACK, JSON) if c is not None}
+
+
+def supported_names():
+    return list(available_codecs)
+
+
+def get_codec(name):
+    try:
+        return available_codecs[name]
+    except KeyError:
+        raise ValueError(f"Unsupported codec {name}")
+
+
+def decode_payload(raw):
+    """Decode a value the mod encoded separately from its message: MessagePack arrives as bytes, JSON as text"""
+    if isinstance(raw, (bytes, bytearray)):
+        if MSGPACK is None:
+            raise ValueError("Received MessagePack payload but msgpack is not installed")
+        return MSGPACK.decode(raw)
+    return JSON.decode(raw)
+
+
+def decode(frame):
+    if frame[:1] == b"{":
+        return JSON.decode(frame)
+    if MSGPACK is None:
+        raise ValueError("Received MessagePack frame but msgpack is not installed")
+    return MSGPACK.decode(frame)
@@ -0,0 +1,56 @@
+"""
+In-process counters and timings for the mod connection. The "game state write" command dumps a
+snapshot to the debug directory.
+"""
+import collections
+import time
+
+started_at = time.perf_counter()
+counters = collections.Counter()
+timings = {}
+gauges = {}
+
+
+class Timing:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds, count=1):
+        self.count += count
+        self.total += seconds
+        self.max = max(self.max, seconds / count)
+
+    def as_dict(self):
+        mean = self.total / self.count if self.count else 0
+        return {"count": self.count, "mean_ms": mean * 1000, "max_ms": self.max * 1000}
+
+
+def incr(name, amount=1):
+    counters[name] += amount
+
+
+def record_time(name, seconds, count=1):
+    """Record time spent on `count` items, e.g. one read that produced several frames"""
+    timing = timings.get(name)
+    if timing is None:
+        timing = timings[name] = Timing()
+    timing.add(seconds, count)
+
+
+def register_gauge(name, fn):
+    gauges[name] = fn
+
+
+def snapshot():
+    uptime = time.perf_counter() - started_at
+    return {
+        "uptime": uptime,
+        "counters": dict(counters),
+        "per_second": {name: count / uptime for name, count in counters.items()},
+        "timings": {name: t.as_dict() for name, t in timings.items()},
+        "gauges": {name: fn() for name, fn in gauges.items()},
+    }
@@ -0,0 +1,178 @@
+"""
+Frame IO for the named pipes shared with the mod. Each frame is a little-endian uint32 length
+followed by that many bytes, matching BinaryReader/BinaryWriter on the C# side.
+"""
+import collections
+import struct
+import threading
+import time
+
+import metrics
+
+FRAME_HEADER = struct.Struct("<I")
+
+
+def split_frames(view, end):
+    """Return every complete frame in view[:end] and the offset where the first partial frame starts"""
+    frames = []
+    offset = 0
+    header_size = FRAME_HEADER.size
+    while end - offset >= header_size:
+        (size,) = FRAME_HEADER.unpack_from(view, offset)
+        frame_end = offset + header_size + size
+        if frame_end > end:
+            break
+        frames.append(bytes(view[offset + header_size : frame_end]))
+        offset = frame_end
+    return frames, offset
+
+
+class FrameReader:
+    """
+    Blocking pipe reads can't be awaited with the default event loop on Windows, so a thread does
+    large reads into one reusable buffer and hands every complete frame from a read to the loop in a
+    single call_soon_threadsafe.
+    """
+
+    def __init__(self, pipe_file, on_frame, on_disconnect, buffer_size=1 << 16):
+        self.pipe_file = pipe_file
+        self.on_frame = on_frame
+        self.on_disconnect = on_disconnect
+        self.buffer_size = buffer_size
+
+    def start(self, loop):
+        threading.Thread(target=self._run, daemon=True, args=(loop,)).start()
+
+    def _run(self, loop):
+        buf = bytearray(self.buffer_size)
+        filled = 0
+        unreported_bytes = 0
+        try:
+            while True:
+                with memoryview(buf) as view, view[filled:] as free:
+                    n = self.pipe_file.readinto(free)
+                if not n:
+                    break
+                read_at = time.perf_counter()
+                filled += n
+                unreported_bytes += n
+                with memoryview(buf) as view:
+                    frames, consumed = split_frames(view, filled)
+                if frames:
+                    loop.call_soon_threadsafe(self._dispatch, frames, unreported_bytes, read_at)
+                    unreported_bytes = 0
+                if consumed:
+                    # keep the start of the next frame at the beginning of the buffer
+                    buf[: filled - consumed] = buf[consumed:filled]
+                    filled -= consumed
+                if filled >= FRAME_HEADER.size:
+                    (size,) = FRAME_HEADER.unpack_from(buf, 0)
+                    needed = FRAME_HEADER.size + size
+                    if needed > len(buf):
+                        buf.extend(bytes(needed - len(buf)))
+        except (OSError, ValueError):
+            pass
+        self.on_disconnect()
+
+    def _dispatch(self, frames, nbytes, read_at):
+        start = time.perf_counter()
+        metrics.record_time("pipe.read.handoff", start - read_at)
+        metrics.incr("pipe.read.batches")
+        metrics.incr("pipe.read.frames", len(frames))
+        metrics.incr("pipe.read.bytes", nbytes)
+        for frame in frames:
+            self.on_frame(frame)
+        metrics.record_time("pipe.read.per_frame", time.perf_counter() - start, count=len(frames))
+
+
+class FrameWriter:
+    """
+    Thread-safe writer that keeps pipe writes off the event loop. Frames queued during one loop
+    iteration, from any thread, are joined and written by a dedicated thread in a single call.
+    Urgent frames skip the coalescing and are written before any queued normal batch.
+    """
+
+    def __init__(self, pipe_file, on_disconnect):
+        self.pipe_file = pipe_file
+        self.on_disconnect = on_disconnect
+        self.loop = None
+        self.loop_thread_id = None
+        self.lock = threading.Lock()
+        self.batch_ready = threading.Condition(self.lock)
+        self.pending = []
+        self.pending_since = None
+        self.flush_scheduled = False
+        self.unwritten_frames = 0
+        self.urgent_batches = collections.deque()
+        self.batches = collections.deque()
+
+    def start(self, loop):
+        """Call from the event loop thread"""
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def write(self, frame, urgent=False):
+        if urgent:
+            with self.lock:
+                self._queue_batch(self.urgent_batches, [FRAME_HEADER.pack(len(frame)), frame], time.perf_counter())
+            return
+        with self.lock:
+            if self.pending_since is None:
+                self.pending_since = time.perf_counter()
+            self.pending.append(FRAME_HEADER.pack(len(frame)))
+            self.pending.append(frame)
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+        if self.loop is None:
+            # nothing to coalesce with before the loop starts, written once the writer thread is up
+            self.flush()
+        elif threading.get_ident() == self.loop_thread_id:
+            self.loop.call_soon(self.flush)
+        else:
+            self.loop.call_soon_threadsafe(self.flush)
+
+    def flush(self):
+        with self.lock:
+            chunks, self.pending = self.pending, []
+            since, self.pending_since = self.pending_since, None
+            self.flush_scheduled = False
+            if chunks:
+                self._queue_batch(self.batches, chunks, since)
+
+    def _queue_batch(self, lane, chunks, since):
+        frame_count = len(chunks) // 2
+        self.unwritten_frames += frame_count
+        lane.append((b"".join(chunks), frame_count, since))
+        self.batch_ready.notify()
+
+    def queue_depth(self):
+        with self.lock:
+            return self.unwritten_frames + len(self.pending) // 2
+
+    def _next_batch(self):
+        with self.lock:
+            while not (self.urgent_batches or self.batches):
+                self.batch_ready.wait()
+            if self.urgent_batches:
+                return self.urgent_batches.popleft() + ("urgent",)
+            return self.batches.popleft() + ("normal",)
+
+    def _run(self):
+        while True:
+            data, frame_count, since, lane = self._next_batch()
+            try:
+                with memoryview(data) as view:
+                    written = 0
+                    while written < len(data):
+                        written += self.pipe_file.write(view[written:])
+            except (OSError, ValueError):
+                self.on_disconnect()
+                return
+            with self.lock:
+                self.unwritten_frames -= frame_count
+            metrics.record_time(f"pipe.write.{lane}.flush_latency", time.perf_counter() - since)
+            metrics.incr("pipe.write.batches")
+            metrics.incr("pipe.write.frames", frame_count)
+            metrics.incr("pipe.write.bytes", len(data))
@@ -0,0 +1,135 @@
+"""
+Passability grid of a location as sent by the mod's GET_PASSABILITY_GRID, and the path searches over it.
+No game or pipe state here so it can be used on recorded grids, e.g. by benchmarks/pathfinding_benchmark.py.
+"""
+import base64
+import collections
+import heapq
+
+# x, y offsets indexed like Pathfinder.Directions in the mod
+DIRECTIONS = ((-1, 0), (1, 0), (0, 1), (0, -1))
+
+
+class PassabilityGrid:
+    def __init__(self, value):
+        self.location = value["location"]
+        self.map_width = value["mapWidth"]
+        self.map_height = value["mapHeight"]
+        self.origin_x = value["originX"]
+        self.origin_y = value["originY"]
+        self.width = value["width"]
+        self.height = value["height"]
+        bits = base64.b64decode(value["tiles"])
+        self.walkable = bytes((bits[i >> 3] >> (i & 7)) & 1 for i in range(self.width * self.height))
+
+    def contains(self, x, y):
+        gx, gy = x - self.origin_x, y - self.origin_y
+        return 0 <= gx < self.width and 0 <= gy < self.height
+
+    def is_walkable(self, x, y):
+        gx, gy = x - self.origin_x, y - self.origin_y
+        if 0 <= gx < self.width and 0 <= gy < self.height:
+            return self.walkable[gy * self.width + gx] == 1
+        return False
+
+    def is_off_map(self, x, y):
+        return x < 0 or y < 0 or x >= self.map_width or y >= self.map_height
+
+
+def search_directions(start, end):
+    """Same order as Pathfinder.SearchDirections: toward the end point along the longer axis first"""
+    x_diff = end[0] - start[0]
+    y_diff = end[1] - start[1]
+    if abs(y_diff) > abs(x_diff):
+        first = 2 if y_diff > 0 else 0
+        second = 1 if x_diff > 0 else 3
+    else:
+        first = 1 if x_diff > 0 else 3
+        second = 2 if y_diff > 0 else 0
+    third = second + 2 if second < 2 else second - 2
+    fourth = first + 2 if first < 2 else first - 2
+    return [DIRECTIONS[first], DIRECTIONS[second], DIRECTIONS[third], DIRECTIONS[fourth]]
+
+
+def find_path(grid: PassabilityGrid, start, end, limit=-1):
+    """List of (x, y) tiles from start to end inclusive, None if there's no path within `limit` iterations"""
+    end_x, end_y = end
+    directions = search_directions(start, end)
+    counter = 0
+    open_list = [(abs(end_x - start[0]) + abs(end_y - start[1]), counter, start, 0)]
+    parents = {start: None}
+    closed = set()
+    iterations = 0
+    while open_list:
+        _, _, node, g = heapq.heappop(open_list)
+        if node == end:
+            path = []
+            while node is not None:
+                path.append(node)
+                node = parents[node]
+            path.reverse()
+            return path
+        closed.add(node)
+        # the mod keeps g in a byte
+        ng = (g + 1) & 0xFF
+        x, y = node
+        for dx, dy in directions:
+            neighbor = nx, ny = x + dx, y + dy
+            if neighbor in closed:
+                continue
+            closed.add(neighbor)
+            if not grid.is_walkable(nx, ny) or (neighbor != end and grid.is_off_map(nx, ny)):
+                continue
+            parents[neighbor] = node
+            counter += 1
+            heapq.heappush(open_list, (ng + abs(end_x - nx) + abs(end_y - ny), counter, neighbor, ng))
+        iterations += 1
+        if limit >= 0 and iterations >= limit:
+            return None
+    return None
+
+
+def find_goals(grid: PassabilityGrid, start, goals):
+    """
+    Breadth first search from start toward every (tile, adjacent) goal. Adjacent goals are reached by
+    standing next to the tile, or on it if that's where the search starts, like path_to_adjacent. Returns
+    [(goal, path)] for every reachable goal, nearest first.
+    """
+    reached_from = collections.defaultdict(list)  # tile -> goals reached by standing on it
+    tile_goals = {tile for tile, adjacent in goals if not adjacent}
+    for goal in goals:
+        (x, y), adjacent = goal
+        if adjacent:
+            for dx, dy in DIRECTIONS:
+                reached_from[(x + dx, y + dy)].append(goal)
+        # an adjacent goal's own tile is never reached before a tile next to it unless it's the start
+        reached_from[(x, y)].append(goal)
+    remaining = set(goals)
+    found = {}
+    parents = {start: None}
+    queue = collections.deque([start])
+    while queue and remaining:
+        node = queue.popleft()
+        for goal in reached_from.get(node, ()):
+            if goal in remaining:
+                remaining.discard(goal)
+                path = []
+                walk = node
+                while walk is not None:
+                    path.append(walk)
+                    walk = parents[walk]
+                path.reverse()
+                found[goal] = path
+        x, y = node
+        if node != start and grid.is_off_map(x, y):
+            continue
+        for dx, dy in DIRECTIONS:
+            neighbor = nx, ny = x + dx, y + dy
+            if neighbor in parents or not grid.is_walkable(nx, ny):
+                continue
+            # like the end point of a path, only a tile goal can be off the map
+            if grid.is_off_map(nx, ny) and neighbor not in tile_goals:
+                continue
+            parents[neighbor] = node
+            queue.append(neighbor)
+    return list(found.items())
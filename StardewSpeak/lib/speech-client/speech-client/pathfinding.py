@@ -0,0 +1,116 @@
+"""
+Path queries answered in the client from the mod's passability grid for the current location, instead
+of a round trip to the mod's Pathfinder for every path_to_tile/PATH_TO_PLAYER query.
+
+The grid is fetched once per location through the request cache and dropped on warps and terrain or
+object changes, after a few seconds since moving characters send no event, and when a move along a path
+fails. The search mirrors Pathfinder.findPath in the mod step for step (search direction order,
+f = g + manhattan distance with first-in-first-out ties, tiles closed when they are queued, the end point
+allowed off the map) so both return the same path. Anything the grid can't answer, e.g.
+another location or a start tile outside the grid, returns NO_GRID and callers ask the mod instead.
+
+The grid and the searches themselves are in passability.py. find_goals searches toward many targets at
+once, so picking the nearest reachable one of a list of candidates costs one search rather than one
+failed search per unreachable candidate.
+"""
+import time
+
+import metrics, passability, request_cache, server
+
+NO_GRID = object()
+GRID_REQUEST = "GET_PASSABILITY_GRID"
+
+
+async def get_grid():
+    try:
+        value = await server.request(GRID_REQUEST)
+    except Exception:
+        metrics.incr("pathfinding.grid.failed")
+        return None
+    return _grid_for(value)
+
+
+def forget_grid():
+    """Fetch the grid again next time, something it doesn't know about blocked the way"""
+    request_cache.discard(GRID_REQUEST)
+    metrics.incr("pathfinding.grid.forgotten")
+
+
+# (location, tiles) -> PassabilityGrid, decoded once per cached response. Cache hits are copies of the
+# response but copying keeps the same tiles string, so the lookup hashes nothing new.
+_grids = {}
+
+
+def _grid_for(value):
+    if value is None:
+        return None
+    key = value["location"], value["tiles"]
+    grid = _grids.get(key)
+    if grid is not None:
+        return grid
+    grid = passability.PassabilityGrid(value)
+    _grids.clear()
+    _grids[key] = grid
+    metrics.incr("pathfinding.grid.decoded")
+    return grid
+
+
+async def player_tile():
+    """Location and tile of the player, from an open PLAYER_STATUS stream if it's recent enough"""
+    for source in list(server.stream_sources.values()):
+        if source.value_type != "PLAYER_STATUS" or not source.has_value or source.latest_tick is None:
+            continue
+        if server.current_tick - source.latest_tick > server.MAX_STREAM_TICKS:
+            continue
+        status = source.latest_value
+        # a stale tile is still right as long as the player is standing still
+        if not status.get("isMoving", True):
+            return status["location"], (status["tileX"], status["tileY"])
+    status = await server.request("PLAYER_STATUS", single_flight=True)
+    return status["location"], (status["tileX"], status["tileY"])
+
+
+async def path_from_player(end, location, cutoff=-1):
+    """Local equivalent of the path_to_tile request"""
+    player_location, start = await player_tile()
+    if player_location != location:
+        metrics.incr("pathfinding.fallback")
+        return NO_GRID
+    return await local_path(location, start, end, cutoff=cutoff)
+
+
+async def path_to_player(start, cutoff=-1):
+    """Local equivalent of the PATH_TO_PLAYER request, (tiles, location)"""
+    location, end = await player_tile()
+    tiles = await local_path(location, start, end, cutoff=cutoff)
+    if tiles is NO_GRID:
+        return NO_GRID
+    return tiles, location
+
+
+async def nearest_goals(location, start, goals):
+    """passability.find_goals from start in `location`, or NO_GRID if the candidates have to be tried one by one"""
+    grid = await get_grid()
+    if grid is None or grid.location != location or not grid.contains(*start):
+        metrics.incr("pathfinding.fallback")
+        return NO_GRID
+    started = time.perf_counter()
+    found = passability.find_goals(grid, tuple(start), goals)
+    metrics.record_time("pathfinding.goals", time.perf_counter() - started)
+    metrics.incr("pathfinding.goals.unreachable", len(set(goals)) - len(found))
+    return found
+
+
+async def local_path(location, start, end, cutoff=-1):
+    """
+    (x, y) tiles from start to end in `location`, None if unreachable, or NO_GRID if the query has to go
+    to the mod
+    """
+    grid = await get_grid()
+    if grid is None or grid.location != location or not grid.contains(*start):
+        metrics.incr("pathfinding.fallback")
+        return NO_GRID
+    started = time.perf_counter()
+    path = passability.find_path(grid, tuple(start), tuple(end), limit=cutoff)
+    metrics.record_time("pathfinding.local", time.perf_counter() - started)
+    return path
@@ -0,0 +1,117 @@
+"""
+Small declarative predicates over stream values, e.g. field("isTimingCast") & (field("castingPower") > 0.95).
+
+A predicate can be called like a lambda on the client, and it also serializes to a spec the mod
+evaluates itself (see Predicate.cs) so Stream.wait doesn't need every tick's value sent over.
+"""
+import collections.abc
+
+
+class Predicate:
+    def __call__(self, value):
+        raise NotImplementedError
+
+    def to_spec(self):
+        raise NotImplementedError
+
+    def __and__(self, other):
+        return Combined("and", [self, other])
+
+    def __or__(self, other):
+        return Combined("or", [self, other])
+
+    def __invert__(self):
+        return Not(self)
+
+
+def truthy(value):
+    return value not in (None, False, 0, "") and value != [] and value != {}
+
+
+class Field(Predicate):
+    """A top-level field of the value. On its own it's true when the field is truthy."""
+
+    __hash__ = None
+
+    def __init__(self, name):
+        self.name = name
+
+    def get(self, value):
+        return value.get(self.name) if isinstance(value, collections.abc.Mapping) else None
+
+    def __call__(self, value):
+        return truthy(self.get(value))
+
+    def to_spec(self):
+        return {"op": "truthy", "field": self.name}
+
+    def __eq__(self, other):
+        return Compare("eq", self, other)
+
+    def __ne__(self, other):
+        return Compare("ne", self, other)
+
+    def __lt__(self, other):
+        return Compare("lt", self, other)
+
+    def __le__(self, other):
+        return Compare("le", self, other)
+
+    def __gt__(self, other):
+        return Compare("gt", self, other)
+
+    def __ge__(self, other):
+        return Compare("ge", self, other)
+
+
+def field(name):
+    return Field(name)
+
+
+class Compare(Predicate):
+    ops = {
+        "eq": lambda a, b: a == b,
+        "ne": lambda a, b: a != b,
+        "lt": lambda a, b: a < b,
+        "le": lambda a, b: a <= b,
+        "gt": lambda a, b: a > b,
+        "ge": lambda a, b: a >= b,
+    }
+
+    def __init__(self, op, field, operand):
+        self.op = op
+        self.field = field
+        self.operand = operand
+
+    def __call__(self, value):
+        actual = self.field.get(value)
+        if actual is None and self.op not in ("eq", "ne"):
+            return False
+        return self.ops[self.op](actual, self.operand)
+
+    def to_spec(self):
+        return {"op": self.op, "field": self.field.name, "value": self.operand}
+
+
+class Combined(Predicate):
+    def __init__(self, op, args):
+        self.op = op
+        self.args = args
+
+    def __call__(self, value):
+        results = (arg(value) for arg in self.args)
+        return all(results) if self.op == "and" else any(results)
+
+    def to_spec(self):
+        return {"op": self.op, "args": [arg.to_spec() for arg in self.args]}
+
+
+class Not(Predicate):
+    def __init__(self, arg):
+        self.arg = arg
+
+    def __call__(self, value):
+        return not self.arg(value)
+
+    def to_spec(self):
+        return {"op": "not", "arg": self.arg.to_spec()}
@@ -0,0 +1,153 @@
+"""
+Compact read-only records for the mod values the client handles most often: PLAYER_STATUS and
+TOOL_STATUS stream values and location objects. Each one is a __slots__ object instead of
+a dict, and names that repeat from message to message (locations, items, tools) are interned so every
+record shares one string.
+
+Records are Mappings, so code indexing them like the dicts they replace keeps working. Fields the mod
+didn't send raise KeyError like a missing dict key, and unexpected fields are kept as well.
+"""
+import collections.abc
+import sys
+
+_MISSING = object()
+
+
+def json_default(obj):
+    """`default` hook for json.dumps and msgpack.packb"""
+    if isinstance(obj, collections.abc.Mapping):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class Record(collections.abc.Mapping):
+    __slots__ = ("_extra",)
+    fields = ()
+    interned = frozenset()
+    _field_set = frozenset()
+
+    def __init__(self, values):
+        intern = sys.intern
+        for name in self.fields:
+            value = values.get(name, _MISSING)
+            if value.__class__ is str and name in self.interned:
+                value = intern(value)
+            setattr(self, name, value)
+        extra = None
+        if not self._field_set.issuperset(values):
+            extra = {k: v for k, v in values.items() if k not in self._field_set}
+        self._extra = extra
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._field_set = frozenset(cls.fields)
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            value = getattr(self, key)
+            if value is not _MISSING:
+                return value
+        elif self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __iter__(self):
+        for name in self.fields:
+            if getattr(self, name) is not _MISSING:
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+    # read-only, so a copy can be the record itself
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class PlayerStatus(Record):
+    fields = (
+        "location",
+        "position",
+        "center",
+        "tileX",
+        "tileY",
+        "canMove",
+        "facingDirection",
+        "isMoving",
+        "lastWarp",
+        "currentEvent",
+    )
+    __slots__ = fields
+    interned = frozenset({"location"})
+
+
+class ToolStatus(Record):
+    fields = (
+        "netName",
+        "stack",
+        "displayName",
+        "name",
+        "type",
+        "isTool",
+        "upgradeLevel",
+        "power",
+        "baseName",
+        "inUse",
+        "tileX",
+        "tileY",
+        "castingPower",
+        "isNibbling",
+        "isFishing",
+        "isLostItem",
+        "isReeling",
+        "isTimingCast",
+    )
+    __slots__ = fields
+    interned = frozenset({"netName", "displayName", "name", "type", "baseName"})
+
+
+class LocationObject(Record):
+    fields = (
+        "name",
+        "tileX",
+        "tileY",
+        "type",
+        "isForage",
+        "readyForHarvest",
+        "canBeGrabbed",
+        "isOnScreen",
+        "parentSheetIndex",
+        "category",
+    )
+    __slots__ = fields
+    interned = frozenset({"name", "type"})
+
+
+# request or stream type -> record for the whole value
+value_records = {
+    "PLAYER_STATUS": PlayerStatus,
+    "TOOL_STATUS": ToolStatus,
+}
+# request type -> record for each entry of a list value
+list_records = {
+    "GET_LOCATION_OBJECTS": LocationObject,
+}
+
+
+def from_wire(request_type, value):
+    """Build records from a decoded mod value, anything else is returned unchanged"""
+    record = value_records.get(request_type)
+    if record is not None:
+        return record(value) if isinstance(value, dict) else value
+    record = list_records.get(request_type)
+    if record is not None and isinstance(value, list):
+        return [record(x) if isinstance(x, dict) else x for x in value]
+    return value
@@ -0,0 +1,136 @@
+"""
+Read-through cache for mod queries whose answer only changes on specific game events. Each cached
+request type declares the events that invalidate it; entries also expire after a TTL as a safety net
+and the least recently used entries are dropped once the cache is full.
+
+Futures are cached rather than values so concurrent callers share the same in-flight request, and each
+caller gets its own deep copy of the response so none of them can change what the next one sees. Pipe
+messages are ordered, so a response computed before a warp always arrives before the WARPED event
+that drops it.
+"""
+import collections
+import json
+import time
+
+import metrics
+import records
+
+WARPED = "WARPED"
+SAVE_LOADED = "SAVE_LOADED"
+TERRAIN_FEATURE_LIST_CHANGED = "TERRAIN_FEATURE_LIST_CHANGED"
+LARGE_TERRAIN_FEATURE_LIST_CHANGED = "LARGE_TERRAIN_FEATURE_LIST_CHANGED"
+OBJECT_LIST_CHANGED = "OBJECT_LIST_CHANGED"
+DAY_STARTED = "DAY_STARTED"
+LOCATION_LIST_CHANGED = "LOCATION_LIST_CHANGED"
+
+MAX_ENTRIES = 128
+
+
+class CachePolicy:
+    def __init__(self, triggers, ttl=300):
+        self.triggers = frozenset(triggers)
+        self.ttl = ttl
+
+
+# all of these except GET_ALL_GAME_LOCATIONS are answered for the player's current location
+policies = {
+    "GET_LOCATION_CONNECTIONS": CachePolicy({WARPED, SAVE_LOADED, DAY_STARTED}),
+    "GET_LOCATION_BUILDINGS": CachePolicy({WARPED, SAVE_LOADED, DAY_STARTED}),
+    "GET_WATER_TILES": CachePolicy({WARPED, SAVE_LOADED, DAY_STARTED}),
+    "SHIPPING_BIN_TILE": CachePolicy({WARPED, SAVE_LOADED}),
+    "BED_TILE": CachePolicy({WARPED, SAVE_LOADED, DAY_STARTED}),
+    "ROUTE": CachePolicy({WARPED, SAVE_LOADED, DAY_STARTED, LOCATION_LIST_CHANGED}),
+    "GET_ALL_GAME_LOCATIONS": CachePolicy({SAVE_LOADED, DAY_STARTED, LOCATION_LIST_CHANGED}),
+    # characters also block tiles but send no event when they move, hence the short TTL. A move that fails
+    # partway along a path drops the grid as well.
+    "GET_PASSABILITY_GRID": CachePolicy(
+        {
+            WARPED,
+            SAVE_LOADED,
+            DAY_STARTED,
+            TERRAIN_FEATURE_LIST_CHANGED,
+            LARGE_TERRAIN_FEATURE_LIST_CHANGED,
+            OBJECT_LIST_CHANGED,
+        },
+        ttl=3,
+    ),
+}
+
+
+class CacheEntry:
+    __slots__ = ("future", "expires_at", "triggers")
+
+    def __init__(self, future, expires_at, triggers):
+        self.future = future
+        self.expires_at = expires_at
+        self.triggers = triggers
+
+
+class RequestCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            metrics.incr("request_cache.miss")
+            return None
+        if entry.expires_at is not None and time.monotonic() >= entry.expires_at:
+            del self.entries[key]
+            metrics.incr("request_cache.expired")
+            metrics.incr("request_cache.miss")
+            return None
+        self.entries.move_to_end(key)
+        metrics.incr("request_cache.hit")
+        return entry.future
+
+    def put(self, key, future, policy):
+        expires_at = None if policy.ttl is None else time.monotonic() + policy.ttl
+        self.entries[key] = CacheEntry(future, expires_at, policy.triggers)
+        self.entries.move_to_end(key)
+        future.add_done_callback(lambda fut: self._drop_failed(key, fut))
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            metrics.incr("request_cache.evicted")
+
+    def _drop_failed(self, key, future):
+        if future.cancelled() or future.exception() is not None:
+            entry = self.entries.get(key)
+            if entry is not None and entry.future is future:
+                del self.entries[key]
+
+    def invalidate(self, event_type):
+        stale = [k for k, entry in self.entries.items() if event_type in entry.triggers]
+        for k in stale:
+            del self.entries[k]
+        if stale:
+            metrics.incr("request_cache.invalidated", len(stale))
+
+    def clear(self):
+        self.entries.clear()
+
+
+cache = RequestCache()
+metrics.register_gauge("request_cache.size", lambda: len(cache.entries))
+
+
+def trigger_events():
+    return frozenset().union(*(policy.triggers for policy in policies.values()))
+
+
+def policy_for(request_type):
+    return policies.get(request_type)
+
+
+def cache_key(request_type, data):
+    return (request_type, json.dumps(data, sort_keys=True, separators=(",", ":"), default=records.json_default))
+
+
+def invalidate(event_type):
+    cache.invalidate(event_type)
+
+
+def discard(request_type, data=None):
+    """Drop one cached request, e.g. when its answer turned out to be out of date"""
+    cache.entries.pop(cache_key(request_type, {} if data is None else data), None)
@@ -0,0 +1,85 @@
+"""
+Tracks requests waiting on a mod response. Each request gets a deadline from its type; requests that
+are cancelled by the caller or run past their deadline are dropped and reported through on_abandoned
+so the mod can stop working on them.
+"""
+import asyncio
+import functools
+import time
+
+import metrics
+
+DEFAULT_DEADLINE = 60
+# seconds, None for no deadline. The mod stops answering most requests while saving or loading, so
+# anything the client polls in the background shouldn't expire.
+deadlines = {
+    "HEARTBEAT": None,
+    "NEGOTIATE_CODEC": None,
+    "GET_ACTIVE_MENU": None,
+    "GET_MENU_SNAPSHOT": None,
+    "path_to_tile": 20,
+    "GET_PASSABILITY_GRID": 20,
+    "PATH_TO_PLAYER": 20,
+    "PATH_TO_EDGE": 20,
+    "GET_NEAREST_CHARACTER": 20,
+    "ROUTE": 20,
+}
+AGE_BUCKETS = (1, 5, 30)
+
+
+class PendingRequest:
+    __slots__ = ("id", "type", "future", "sent_at", "deadline")
+
+    def __init__(self, msg_id, request_type, future, sent_at, deadline):
+        self.id = msg_id
+        self.type = request_type
+        self.future = future
+        self.sent_at = sent_at
+        self.deadline = deadline
+
+
+class RequestRegistry:
+    def __init__(self, on_abandoned):
+        self.pending = {}
+        self.on_abandoned = on_abandoned
+
+    def add(self, msg_id, request_type, future, deadline=None):
+        now = time.monotonic()
+        timeout = deadlines.get(request_type, DEFAULT_DEADLINE) if deadline is None else deadline
+        expires_at = None if timeout is None else now + timeout
+        self.pending[msg_id] = PendingRequest(msg_id, request_type, future, now, expires_at)
+        future.add_done_callback(functools.partial(self._on_done, msg_id))
+
+    def resolve(self, msg_id):
+        entry = self.pending.pop(msg_id, None)
+        if entry is not None:
+            metrics.record_time("requests.round_trip", time.monotonic() - entry.sent_at)
+        return entry
+
+    def _on_done(self, msg_id, future):
+        if future.cancelled() and msg_id in self.pending:
+            entry = self.pending.pop(msg_id)
+            metrics.incr("requests.abandoned")
+            metrics.incr(f"requests.abandoned.{entry.type}")
+            self.on_abandoned(entry)
+
+    def sweep(self, now=None):
+        now = time.monotonic() if now is None else now
+        expired = [e for e in self.pending.values() if e.deadline is not None and now >= e.deadline]
+        for entry in expired:
+            del self.pending[entry.id]
+            metrics.incr("requests.timed_out")
+            if not entry.future.done():
+                entry.future.set_exception(asyncio.TimeoutError(f"{entry.type} request {entry.id} timed out"))
+            self.on_abandoned(entry)
+        return expired
+
+    def age_distribution(self, now=None):
+        now = time.monotonic() if now is None else now
+        counts = {f"<{b}s": 0 for b in AGE_BUCKETS}
+        counts[f">={AGE_BUCKETS[-1]}s"] = 0
+        for entry in self.pending.values():
+            age = now - entry.sent_at
+            bucket = next((f"<{b}s" for b in AGE_BUCKETS if age < b), f">={AGE_BUCKETS[-1]}s")
+            counts[bucket] += 1
+        return counts
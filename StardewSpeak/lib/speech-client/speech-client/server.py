@@ -1,32 +1,74 @@
 import time
 import logging
 import args
-import struct
 import async_timeout
 import traceback
 import weakref
+import copy
 import functools
-import queue
 import sys
 import asyncio
 import threading
-import uuid
+import itertools
 import json
 from dragonfly import *
 from srabuilder import rules
 
 import constants
+import message_codec
+import metrics
+import named_pipe
+import predicates
+import records
+import request_cache
+import request_registry
 
 if args.args.named_pipe:
     named_pipe_file = open(rf"\\.\pipe\{args.args.named_pipe}Reader", "r+b", 0)
     named_pipe_file_read = open(rf"\\.\pipe\{args.args.named_pipe}Writer", "r+b", 0)
+    writer = named_pipe.FrameWriter(named_pipe_file, lambda: graceful_exit("Named pipe broken"))
+    metrics.register_gauge("pipe.write.queue_depth", writer.queue_depth)
 else:
     named_pipe_file = None
     named_pipe_file_read = None
+    writer = None
 
 loop = None
-streams = {}
-mod_requests = {}
+streams = {}  # mod stream id -> StreamSource
+stream_sources = {}  # (name, canonical data) -> StreamSource
+mod_requests = request_registry.RequestRegistry(lambda entry: cancel_mod_request(entry))
+metrics.register_gauge("requests.pending", lambda: len(mod_requests.pending))
+metrics.register_gauge("requests.pending.age", mod_requests.age_distribution)
+metrics.register_gauge("streams.sources", lambda: len(streams))
+metrics.register_gauge("streams.consumers", lambda: sum(len(s.consumers) for s in streams.values()))
+metrics.register_gauge("streams.lingering", lambda: sum(1 for s in streams.values() if s.lingering))
+metrics.register_gauge("streams.rates", lambda: stream_rates())
+# requests made during the current event loop turn, sent together as one REQUEST_BATCH
+pending_batch = []
+pending_batch_lock = threading.Lock()
+loop_thread_id = None
+# (request type, canonical payload) -> shared future for requests made with single_flight=True
+in_flight_requests = {}
+codec = message_codec.JSON
+message_ids = itertools.count(1)
+# latest game tick seen on any mod message, every message is stamped with the tick it was produced on
+current_tick = 0
+
+# how long a stream stays open on the mod after its last consumer closes, in case it's reopened
+STREAM_LINGER_SECONDS = args.args.stream_linger
+# UPDATE_TICKED streams slow down to how fast their consumers read values, but never past this interval
+MAX_STREAM_TICKS = 15
+STREAM_ADAPT_SECONDS = 1
+GAME_TICKS_PER_SECOND = 60
+# gap between clicks so the game sees them as separate presses
+CLICK_INTERVAL_TICKS = 6
+# extra seconds to wait for ticks before giving up, e.g. the mod doesn't serve streams while saving
+TICK_WAIT_GRACE_SECONDS = 1
+
+PRIORITY_URGENT = 0
+PRIORITY_NORMAL = 1
+# movement and stop traffic is handled ahead of anything queued, including large queries
+URGENT_MESSAGE_TYPES = {"UPDATE_HELD_BUTTONS", "RELEASE_ALL_KEYS"}
 
 ongoing_tasks = {}  # not connected to an objective, slide mouse, swing sword etc
 
@@ -67,46 +109,274 @@ async def stop_everything():
     await game.release_all_keys()
 
 
-class Stream:
-    def __init__(self, name, data=None):
-        self.has_value = False
-        self.latest_value = None
-        self.future = loop.create_future()
+class StreamSource:
+    """One mod-side stream, shared by every Stream subscribed with the same name and data."""
+
+    def __init__(self, key, name, data, exclusive=False):
+        self.key = key
         self.name = name
-        self.id = f"{name}_{str(uuid.uuid4())}"
+        self.data = data
+        self.exclusive = exclusive
+        self.id = f"{name}_{next(message_ids)}"
+        self.consumers = set()
+        # PLAYER_STATUS and TOOL_STATUS values are kept as records. Other streams, e.g. ON_WARPED, send
+        # their own values whatever type they're given.
+        self.value_type = data.get("type") if name == "UPDATE_TICKED" and isinstance(data, dict) else None
+        self.has_value = False
+        self._latest_value = None
+        self.encoded_value = None
+        self.latest_tick = None
         self.closed = False
-        self.open(data)
-
-    def set_value(self, value):
-        self.latest_value = value
-        self.has_value = True
-        try:
-            self.future.set_result(None)
-        except asyncio.InvalidStateError:
-            pass
-
-    def open(self, data):
+        self.linger_handle = None
+        # tick waits count on GAME_TICK arriving every tick they asked for, so it keeps its rate
+        adaptive = (
+            name == "UPDATE_TICKED"
+            and not exclusive
+            and isinstance(data, dict)
+            and "ticks" in data
+            and self.value_type != "GAME_TICK"
+        )
+        self.requested_ticks = data["ticks"] if adaptive else None
+        self.ticks = self.requested_ticks
+        self.takes = 0
+        self.starved = False
+        # value is from before the source went back to its requested rate, new readers wait for the next one
+        self.catching_up = False
+        self.open()
+
+    def open(self):
         streams[self.id] = self
+        if not self.exclusive:
+            stream_sources[self.key] = self
+        metrics.incr("streams.opened")
         send_message(
             "NEW_STREAM",
             {
                 "name": self.name,
                 "stream_id": self.id,
-                "data": data,
+                "data": self.data,
             },
         )
 
+    @property
+    def latest_value(self):
+        if self.encoded_value is not None:
+            self._latest_value = records.from_wire(self.value_type, message_codec.decode_payload(self.encoded_value))
+            self.encoded_value = None
+            metrics.incr("streams.decoded")
+        return self._latest_value
+
+    def set_value(self, value, tick=None):
+        self._latest_value = records.from_wire(self.value_type, value)
+        self.set_encoded_value(None, tick)
+
+    def set_encoded_value(self, encoded, tick=None):
+        """Keep a value still in its wire encoding, it's only decoded if a consumer reads it before the next one"""
+        if self.encoded_value is not None:
+            metrics.incr("streams.decodes_avoided")
+        self.encoded_value = encoded
+        self.set_tick(tick)
+
+    def set_tick(self, tick):
+        """The latest value is still current as of game tick `tick`"""
+        self.latest_tick = tick
+        self.has_value = True
+        self.catching_up = False
+        for consumer in self.consumers:
+            consumer.notify()
+
+    def apply_fields(self, changed, tick=None):
+        if not changed:
+            # nothing changed, consumers still get a tick
+            self.set_tick(tick)
+            return
+        self.set_value({**self.latest_value, **changed}, tick)
+
+    def apply_collection(self, ops, tick=None):
+        """Update the local mirror of a keyed collection stream from the mod's upsert/remove operations"""
+        if ops.get("reset"):
+            self.collection_field = ops["field"]
+            self.collection_items = {}
+            self.collection_order = []
+            self.collection_fields = {}
+        elif not (ops.keys() & {"upsert", "remove", "order", "fields"}):
+            # nothing changed, consumers still get a tick
+            self.set_value(self.latest_value, tick)
+            return
+        self.collection_items.update(ops.get("upsert", {}))
+        for key in ops.get("remove", ()):
+            del self.collection_items[key]
+        if "order" in ops:
+            self.collection_order = ops["order"]
+        self.collection_fields.update(ops.get("fields", {}))
+        items = [self.collection_items[key] for key in self.collection_order]
+        if self.collection_field is None:
+            self.set_value(items, tick)
+        else:
+            self.set_value({**self.collection_fields, self.collection_field: items}, tick)
+
+    def record_take(self):
+        self.takes += 1
+
+    def record_starved(self):
+        # a consumer has to wait for a value, go back to the rate it asked for right away
+        self.starved = True
+        if self.ticks is not None and self.ticks > self.requested_ticks:
+            self.set_ticks(self.requested_ticks)
+
+    def adapt_ticks(self, elapsed):
+        """Slow the mod down when consumers read less often than values arrive. Speeding back up happens
+        in record_starved as soon as a consumer has to wait."""
+        takes, starved = self.takes, self.starved
+        self.takes, self.starved = 0, False
+        # a lingering source has nobody reading it, it's either reopened soon or closed anyway
+        if self.requested_ticks is None or self.closed or self.lingering or starved:
+            return
+        # aim for about two values per read so one is always there when the consumer comes back
+        interval = elapsed / takes if takes else elapsed
+        ticks = max(self.requested_ticks, min(MAX_STREAM_TICKS, int(interval * GAME_TICKS_PER_SECOND / 2)))
+        if ticks > self.ticks:
+            self.set_ticks(ticks)
+
+    def set_ticks(self, ticks):
+        metrics.incr("streams.ticks.raised" if ticks > self.ticks else "streams.ticks.lowered")
+        self.ticks = ticks
+        send_message("UPDATE_STREAM", {"stream_id": self.id, "ticks": ticks})
+
+    def add_consumer(self, consumer):
+        if self.linger_handle is not None:
+            self.linger_handle.cancel()
+            self.linger_handle = None
+        if self.ticks is not None and self.ticks > self.requested_ticks:
+            # a throttled source's value can be several ticks old
+            self.catching_up = self.has_value
+            self.set_ticks(self.requested_ticks)
+        self.consumers.add(consumer)
+
+    def remove_consumer(self, consumer):
+        self.consumers.discard(consumer)
+        if not self.consumers and not self.closed:
+            # keep receiving values for a bit, tight loops tend to reopen the same stream right away
+            if STREAM_LINGER_SECONDS > 0 and not self.exclusive:
+                self.linger_handle = loop.call_later(STREAM_LINGER_SECONDS, self.close)
+            else:
+                self.close()
+
+    @property
+    def lingering(self):
+        return self.linger_handle is not None
+
     def close(self):
         if not self.closed:
             self.closed = True
+            if self.linger_handle is not None:
+                self.linger_handle.cancel()
+                self.linger_handle = None
             send_message("STOP_STREAM", self.id)
             del streams[self.id]
-            self.set_value(None)
+            if stream_sources.get(self.key) is self:
+                del stream_sources[self.key]
+            for consumer in list(self.consumers):
+                consumer.close()
+
+
+def stream_rates():
+    return {
+        source.id: {
+            "type": source.data["type"],
+            "requested": source.requested_ticks,
+            "ticks": source.ticks,
+            "consumers": len(source.consumers),
+        }
+        for source in streams.values()
+        if source.requested_ticks is not None
+    }
+
+
+async def adapt_stream_rates(interval=STREAM_ADAPT_SECONDS):
+    while True:
+        await asyncio.sleep(interval)
+        for source in list(streams.values()):
+            source.adapt_ticks(interval)
+
+
+def subscribe(consumer, name, data, exclusive=False):
+    key = (name, json.dumps(data, sort_keys=True, separators=(",", ":"), default=records.json_default))
+    source = None if exclusive else stream_sources.get(key)
+    if source is None or source.closed:
+        source = StreamSource(key, name, data, exclusive=exclusive)
+    elif source.lingering:
+        metrics.incr("streams.reused")
+    else:
+        metrics.incr("streams.shared")
+    source.add_consumer(consumer)
+    return source
+
 
-    async def current(self):
-        if self.has_value:
+class Stream:
+    """A consumer of a shared StreamSource. Each consumer has its own cursor, so next() on one stream
+    never steals a value from another."""
+
+    def __init__(
+        self, name, data=None, delta=False, collection=False, changes_only=False, heartbeat_ticks=60, exclusive=False
+    ):
+        self.name = name
+        self.closed = False
+        self.future = loop.create_future()
+        if changes_only:
+            # mod skips values equal to the last one sent, next() then waits for an actual change
+            data = {**data, "changesOnly": True, "heartbeat": heartbeat_ticks}
+        if delta:
+            # mod only sends top-level fields that changed, the source rebuilds the full value
+            data = {**data, "delta": True}
+        if collection:
+            # mod sends list entries keyed by name/id/slot as upsert and remove operations
+            data = {**data, "collection": True}
+        self.source = subscribe(self, name, data, exclusive=exclusive)
+        if self.source.has_value and not self.source.catching_up:
+            # attached to an already running source, the first next() doesn't have to wait a round trip
+            self.notify()
+
+    @property
+    def id(self):
+        return self.source.id
+
+    @property
+    def has_value(self):
+        return self.source.has_value
+
+    @property
+    def latest_value(self):
+        return None if self.closed else self.source.latest_value
+
+    @property
+    def latest_tick(self):
+        return self.source.latest_tick
+
+    def notify(self):
+        try:
+            self.future.set_result(None)
+        except asyncio.InvalidStateError:
+            pass
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.source.remove_consumer(self)
+            self.notify()
+
+    async def current(self, newer_than=None):
+        """Latest value without waiting, or the first one sampled after game tick newer_than"""
+        fresh = self.has_value and not self.source.catching_up
+        if fresh and (newer_than is None or (self.latest_tick or 0) > newer_than):
+            self.source.record_take()
+            if self.latest_tick is not None:
+                metrics.record_time("streams.staleness", (current_tick - self.latest_tick) / GAME_TICKS_PER_SECOND)
             return self.latest_value
-        return await self.next()
+        item = await self.next()
+        while newer_than is not None and (self.latest_tick or 0) <= newer_than:
+            item = await self.next()
+        return item
 
     async def __aenter__(self):
         return self
@@ -124,15 +394,25 @@ class Stream:
         if self.closed:
             raise StreamClosedError("Stream is already closed")
         if not self.future.done():
+            self.source.record_starved()
             await self.future
         if self.closed:
             raise StreamClosedError(f"Stream {self.name} closed while waiting for next value")
         self.future = loop.create_future()
+        self.source.record_take()
         return self.latest_value
 
     async def wait(self, condition, timeout=None):
         async with async_timeout.timeout(timeout):
             item = await self.current()
+            if condition(item):
+                return item
+            if isinstance(condition, predicates.Predicate) and self.source.name == "UPDATE_TICKED":
+                # the mod evaluates the predicate every tick and sends one message once it holds
+                data = {"type": self.source.data["type"], "ticks": 1, "until": condition.to_spec()}
+                with Stream(self.name, data=data, exclusive=True) as until_stream:
+                    metrics.incr("streams.wait.pushed_down")
+                    return await until_stream.next()
             while not condition(item):
                 item = await self.next()
             return item
@@ -142,24 +422,66 @@ class StreamClosedError(Exception):
     pass
 
 
-def player_status_stream(ticks=1):
-    return Stream("UPDATE_TICKED", data={"type": "PLAYER_STATUS", "ticks": ticks})
+def player_status_stream(ticks=1, delta=False, changes_only=False):
+    return Stream(
+        "UPDATE_TICKED", data={"type": "PLAYER_STATUS", "ticks": ticks}, delta=delta, changes_only=changes_only
+    )
+
+
+def tool_status_stream(ticks=1, delta=False, changes_only=False):
+    return Stream("UPDATE_TICKED", data={"type": "TOOL_STATUS", "ticks": ticks}, delta=delta, changes_only=changes_only)
 
 
-def tool_status_stream(ticks=1):
-    return Stream("UPDATE_TICKED", data={"type": "TOOL_STATUS", "ticks": ticks})
+def characters_at_location_stream(ticks=1, collection=True):
+    return Stream("UPDATE_TICKED", data={"type": "CHARACTERS_AT_LOCATION", "ticks": ticks}, collection=collection)
 
 
-def characters_at_location_stream(ticks=1):
-    return Stream("UPDATE_TICKED", data={"type": "CHARACTERS_AT_LOCATION", "ticks": ticks})
+def animals_at_location_stream(ticks=1, collection=True):
+    return Stream("UPDATE_TICKED", data={"type": "ANIMALS_AT_LOCATION", "ticks": ticks}, collection=collection)
 
 
-def animals_at_location_stream(ticks=1):
-    return Stream("UPDATE_TICKED", data={"type": "ANIMALS_AT_LOCATION", "ticks": ticks})
+def player_items_stream(ticks=1, collection=True):
+    return Stream("UPDATE_TICKED", data={"type": "PLAYER_ITEMS", "ticks": ticks}, collection=collection)
 
 
-def player_items_stream(ticks=1):
-    return Stream("UPDATE_TICKED", data={"type": "PLAYER_ITEMS", "ticks": ticks})
+def game_tick_stream():
+    return Stream("UPDATE_TICKED", data={"type": "GAME_TICK", "ticks": 1})
+
+
+async def wait_until_tick(tick):
+    """
+    Wait until the mod has sent something from game tick `tick` or later, or about as long as that should
+    take if the game isn't running updates
+    """
+    if current_tick < tick:
+        timeout = TICK_WAIT_GRACE_SECONDS + (tick - current_tick) / GAME_TICKS_PER_SECOND
+        try:
+            async with async_timeout.timeout(timeout):
+                with game_tick_stream() as stream:
+                    while current_tick < tick:
+                        await stream.next()
+        except asyncio.TimeoutError:
+            metrics.incr("ticks.wait_timed_out")
+    return current_tick
+
+
+async def wait_ticks(count):
+    return await wait_until_tick(current_tick + count)
+
+
+async def wait_next_update():
+    """
+    Wait until the game has run an update since this call, on a one-tick GAME_TICK stream of its own so
+    it's never behind a shared stream's rate
+    """
+    tick = current_tick
+    try:
+        async with async_timeout.timeout(TICK_WAIT_GRACE_SECONDS + 1 / GAME_TICKS_PER_SECOND):
+            with Stream("UPDATE_TICKED", data={"type": "GAME_TICK", "ticks": 1}, exclusive=True) as stream:
+                await stream.current(newer_than=tick)
+    except asyncio.TimeoutError:
+        metrics.incr("ticks.wait_timed_out")
+    return current_tick
 
 
 def on_warped_stream(ticks=1):
@@ -197,10 +519,20 @@ def setup_async_loop():
     loop = asyncio.new_event_loop()
 
     def async_setup(l):
+        global loop_thread_id
+        loop_thread_id = threading.get_ident()
         l.set_exception_handler(exception_handler)
+        l.create_task(negotiate_codec())
+        import events
+
+        events.update_subscriptions()
         l.create_task(menu_changed())
-        l.create_task(async_readline())
+        start_reader(l)
+        if writer:
+            writer.start(l)
         l.create_task(heartbeat(300))
+        l.create_task(sweep_requests())
+        l.create_task(adapt_stream_rates())
         l.create_task(populate_initial_game_event())
         l.run_forever()
 
@@ -221,34 +553,31 @@ def graceful_exit(msg):
     sys.exit(msg)
 
 
-async def request_active_menu_with_delay():
-    import menu_utils
-
-    await asyncio.sleep(1)
-    menu = await menu_utils.get_active_menu()
-    return menu
-
-
 async def menu_changed():
     import game
 
+    # the mod pushes the menu revision and content hash whenever the active menu changes, the menu
+    # itself is only fetched when it's different from the one we already have
     async with on_menu_changed_stream() as mcs:
+        await update_context_menu(await request("GET_MENU_SNAPSHOT", single_flight=True))
         while True:
-            changed_event_coro, active_menu_coro = mcs.next(), request_active_menu_with_delay()
-            done, pending = await asyncio.wait(
-                [changed_event_coro, active_menu_coro], return_when=asyncio.FIRST_COMPLETED
-            )
-            done_task = list(done)[0]
-            done_coro = done_task.get_coro()
-            if done_coro == changed_event_coro:
-                new_menu = done_task.result()["newMenu"]
-            else:
-                new_menu = done_task.result()
-            current_menu = game.context_variables["ACTIVE_MENU"]
-            is_new_menu = not is_same_menu(current_menu, new_menu)
-            game.set_context_menu(new_menu)
-            if is_new_menu:
-                await stop_everything()
+            notification = await mcs.next()
+            if notification["hash"] == game.active_menu_hash:
+                metrics.incr("menu.fetch_skipped")
+                continue
+            metrics.incr("menu.fetched")
+            await update_context_menu(await request("GET_MENU_SNAPSHOT", single_flight=True))
+
+
+async def update_context_menu(snapshot):
+    import game
+
+    new_menu = snapshot["menu"]
+    current_menu = game.context_variables["ACTIVE_MENU"]
+    is_new_menu = not is_same_menu(current_menu, new_menu)
+    game.set_context_menu(new_menu, revision=snapshot["revision"], menu_hash=snapshot["hash"])
+    if is_new_menu:
+        await stop_everything()
 
 
 def is_same_menu(menu1, menu2):
@@ -265,6 +594,14 @@ def is_same_menu(menu1, menu2):
     return True
 
 
+async def negotiate_codec():
+    global codec
+    # The request itself always goes out as JSON since the mod can't know yet what else we understand
+    chosen = await request("NEGOTIATE_CODEC", {"codecs": message_codec.supported_names()})
+    codec = message_codec.get_codec(chosen)
+    log(f"Using {codec.name} codec for mod messages", level=0)
+
+
 async def populate_initial_game_event():
     import game
 
@@ -286,41 +623,69 @@ async def heartbeat(timeout):
         await asyncio.sleep(timeout)
 
 
-async def async_readline():
-    # Is there a better way to read async stdin on Windows?
-    q = queue.Queue()
-
-    def _run(future_queue):
-        while True:
-            fut = future_queue.get()
-            try:
-                n = struct.unpack("I", named_pipe_file_read.read(4))[0]  # Read str length
-                line = named_pipe_file_read.read(n).decode("utf8")  # Read str
-                named_pipe_file_read.seek(0)
-                loop.call_soon_threadsafe(fut.set_result, line)
-            except:
-                graceful_exit("pipe disconnected")
-
-    threading.Thread(target=_run, daemon=True, args=(q,)).start()
+async def sweep_requests(interval=1):
     while True:
-        fut = loop.create_future()
-        q.put(fut)
-        line = await fut
-        on_message(line)
+        await asyncio.sleep(interval)
+        for entry in mod_requests.sweep():
+            log(f"{entry.type} request {entry.id} timed out", level=1)
+
+
+def start_reader(l):
+    if named_pipe_file_read:
+        reader = named_pipe.FrameReader(named_pipe_file_read, on_frame, lambda: graceful_exit("pipe disconnected"))
+        reader.start(l)
+
+
+def on_frame(frame):
+    # one bad message shouldn't drop the rest of the frames from the same read
+    try:
+        on_message(frame)
+    except Exception:
+        log(f"Error handling mod message: {traceback.format_exc()}", level=2)
 
 
 class RequestBuilder:
-    def __init__(self, request_type: str, data=None):
+    def __init__(self, request_type: str, data=None, priority=None):
         self.request_type = request_type
         self.data = {} if data is None else data
+        self.priority = priority
 
-    def request(self, data=None):
+    def request(self, data=None, single_flight=False, use_cache=True):
         data = self.data if data is None else data
+        policy = request_cache.policy_for(self.request_type) if use_cache else None
+        if policy is not None:
+            return self._request_cached(data, policy)
+        if single_flight:
+            return self._request_single_flight(data)
+        return self._send(data)
+
+    def _send(self, data):
         self._fut = loop.create_future()
-        sent_msg = send_message(self.request_type, data)
-        mod_requests[sent_msg["id"]] = self._fut
+        sent_msg = send_message(self.request_type, data, priority=self.priority, batch=True)
+        mod_requests.add(sent_msg["id"], self.request_type, self._fut)
         return self._fut
 
+    def _request_single_flight(self, data):
+        # only for read-only queries: identical requests already waiting on the mod share its response
+        key = request_cache.cache_key(self.request_type, data)
+        shared = in_flight_requests.get(key)
+        if shared is None or shared.done():
+            shared = in_flight_requests[key] = self._send(data)
+            shared.add_done_callback(functools.partial(forget_in_flight_request, key))
+            metrics.incr("requests.single_flight.sent")
+        else:
+            metrics.incr("requests.single_flight.saved")
+        # a caller timing out or being cancelled must not cancel the request for everyone else
+        return copied_result(shared)
+
+    def _request_cached(self, data, policy):
+        key = request_cache.cache_key(self.request_type, data)
+        fut = request_cache.cache.get(key)
+        if fut is None:
+            fut = self._send(data)
+            request_cache.cache.put(key, fut, policy)
+        return copied_result(fut)
+
     def stream(self, ticks=1):
         return Stream("UPDATE_TICKED", data={"type": self.request_type, "ticks": ticks})
 
@@ -331,54 +696,117 @@ class RequestBuilder:
             if isinstance(r, RequestBuilder):
                 msg = {"type": r.request_type, "data": r.data}
             else:
-                msg = {"type": msg[0], data: msg[1]}
+                msg = {"type": r[0], "data": r[1]}
             batched.append(msg)
         return cls("REQUEST_BATCH", batched)
 
 
+def copied_result(shared):
+    """
+    Future for a deep copy of the shared future's result, so no caller can change the value the cache
+    hands to the next one. Cancelling it leaves the shared request alone.
+    """
+    fut = loop.create_future()
+
+    def resolve(shared):
+        if fut.done():
+            return
+        if shared.cancelled():
+            fut.cancel()
+        elif shared.exception() is not None:
+            fut.set_exception(shared.exception())
+        else:
+            fut.set_result(copy.deepcopy(shared.result()))
+
+    shared.add_done_callback(resolve)
+    return fut
+
+
+def forget_in_flight_request(key, fut):
+    if in_flight_requests.get(key) is fut:
+        del in_flight_requests[key]
+
+
 def request_batch(messages):
     msg_type = "REQUEST_BATCH"
     return request(msg_type, messages)
 
 
-def request(msg_type, msg=None):
-    return RequestBuilder(msg_type, msg).request()
+def request(msg_type, msg=None, priority=None, single_flight=False, use_cache=True):
+    return RequestBuilder(msg_type, msg, priority=priority).request(single_flight=single_flight, use_cache=use_cache)
+
+
+def cancel_mod_request(entry):
+    # the mod skips the request if it hasn't started yet, and aborts path searches if it has
+    send_message("CANCEL_REQUEST", entry.id, priority=PRIORITY_URGENT)
 
 
-def send_message(msg_type: str, msg=None):
-    msg_id = str(uuid.uuid4())
+def send_message(msg_type: str, msg=None, priority=None, batch=False):
+    if priority is None:
+        priority = PRIORITY_URGENT if msg_type in URGENT_MESSAGE_TYPES else PRIORITY_NORMAL
+    msg_id = next(message_ids)
     full_msg = {"type": msg_type, "id": msg_id, "data": msg}
-    msg_str = json.dumps(full_msg)
-    # print(msg_str, flush=True)
-    if named_pipe_file:
-        try:
-            named_pipe_file.write(struct.pack("I", len(msg_str)) + msg_str.encode("utf8"))  # Write str length and str
-            named_pipe_file.seek(0)
-        except:
-            graceful_exit("Named pipe broken")
+    if priority == PRIORITY_URGENT:
+        # urgent messages skip ahead of anything waiting, including a pending batch
+        full_msg["priority"] = priority
+        write_message(full_msg, urgent=True)
+    elif batch and loop is not None and loop_thread_id == threading.get_ident():
+        with pending_batch_lock:
+            if not pending_batch:
+                loop.call_soon(flush_request_batch)
+            pending_batch.append(full_msg)
     else:
-        print(msg_str)
+        # keep ordering: anything batched earlier goes out before this message
+        flush_request_batch()
+        write_message(full_msg)
     return full_msg
 
 
-def on_message(msg_str):
+def flush_request_batch():
+    """Send requests gathered during this event loop turn. Each one carries its own id and the mod
+    answers each one with a separate RESPONSE."""
+    with pending_batch_lock:
+        if not pending_batch:
+            return
+        batched = pending_batch[:]
+        pending_batch.clear()
+        if len(batched) == 1:
+            write_message(batched[0])
+        else:
+            write_message({"type": "REQUEST_BATCH", "id": next(message_ids), "data": batched})
+            metrics.incr("requests.batch.frames")
+            metrics.incr("requests.batch.saved", len(batched) - 1)
+
+
+def write_message(full_msg, urgent=False):
+    if writer:
+        writer.write(codec.encode(full_msg), urgent=urgent)
+    else:
+        print(json.dumps(full_msg, default=records.json_default))
+
+
+def on_message(frame):
     import events
 
     try:
-        msg = json.loads(msg_str)
-    except json.JSONDecodeError:
-        log(f"Got invalid message from mod {msg_str}", level=1)
+        msg = message_codec.decode(frame)
+    except ValueError:
+        log(f"Got invalid message from mod {frame!r}", level=1)
         return
     msg_type = msg["type"]
     msg_data = msg["data"]
+    tick = msg.get("tick")
+    if tick is not None:
+        observe_tick(tick)
     if msg_type == "RESPONSE":
-        fut = mod_requests.pop(msg_data["id"], None)
-        if fut:
+        entry = mod_requests.resolve(msg_data["id"])
+        if entry:
+            fut = entry.future
             resp_value = msg_data["value"]
             resp_error = msg_data["error"]
             try:
                 if resp_error is None:
-                    fut.set_result(resp_value)
+                    fut.set_result(records.from_wire(entry.type, resp_value))
                 else:
                     exception = Exception(resp_value)
                     fut.set_exception(exception)
@@ -397,18 +825,27 @@ def on_message(msg_str):
             log(f"Stream {stream_id} error: {stream_value}")
             stream.close()
             return
-        stream.set_value(stream_value)
-        stream.latest_value = stream_value
-        try:
-            stream.future.set_result(None)
-        except asyncio.InvalidStateError:
-            pass
+        delta = msg_data.get("delta")
+        if msg_data.get("encoded"):
+            stream.set_encoded_value(stream_value, tick)
+        elif delta == "fields":
+            stream.apply_fields(stream_value, tick)
+        elif delta == "collection":
+            stream.apply_collection(stream_value, tick)
+        else:
+            stream.set_value(stream_value, tick)
     elif msg_type == "EVENT":
         events.handle_event(msg_data)
     else:
         raise RuntimeError(f"Unhandled message type from mod: {msg_type}")
 
 
+def observe_tick(tick):
+    global current_tick
+    if tick > current_tick:
+        current_tick = tick
+
+
 async def set_mouse_position(x: int, y: int, from_viewport=False):
     await request("SET_MOUSE_POSITION", {"x": x, "y": y, "from_viewport": from_viewport})
 
@@ -422,10 +859,27 @@ async def set_mouse_position_relative(x: int, y: int):
 
 
 async def mouse_click(btn="left", count=1):
-    for i in range(count):
+    if count == 1:
         await request("MOUSE_CLICK", {"btn": btn})
-        if i + 1 < count:
-            await asyncio.sleep(0.1)
+    else:
+        steps = [click_step(btn, ticks=CLICK_INTERVAL_TICKS) for i in range(count - 1)]
+        await ui_sequence(steps + [click_step(btn)])
+
+
+def focus_step(x: int, y: int, ticks=0):
+    return {"action": "focus", "x": x, "y": y, "ticks": ticks}
+
+
+def click_step(btn="left", ticks=0):
+    return {"action": "click", "btn": btn, "ticks": ticks}
+
+
+async def ui_sequence(steps):
+    """
+    Run focus and click steps in the mod, each one waiting its ticks before the next, and return once
+    the last one is done. One round trip however many steps there are.
+    """
+    await request("UI_SEQUENCE", {"steps": steps})
 
 async def mouse_hold(btn="left"):
     import game
@@ -441,7 +895,7 @@ async def mouse_release(btn="left"):
 
 
 def log(*a, sep=" ", level=1):
-    to_send = [x if isinstance(x, str) else json.dumps(x) for x in a]
+    to_send = [x if isinstance(x, str) else json.dumps(x, default=records.json_default) for x in a]
     return send_message("LOG", {"value": sep.join(to_send), "level": level})
 
 
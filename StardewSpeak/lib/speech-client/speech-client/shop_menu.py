@@ -1,6 +1,6 @@
 import dragonfly as df
 from srabuilder import rules
-import title_menu, menu_utils, server, df_utils, game, container_menu
+import title_menu, menu_utils, menu_layout, server, df_utils, game, container_menu
 
 prev_for_sale_index = 0
 inventory_wrapper = menu_utils.InventoryMenuWrapper()
@@ -8,7 +8,7 @@ inventory_wrapper = menu_utils.InventoryMenuWrapper()
 
 async def focus_menu_section(menu, submenu_name: str):
     assert submenu_name in ("inventory", "forSale")
-    for_sale_focused = any(x["containsMouse"] for x in menu["forSaleButtons"])
+    for_sale_focused = menu_layout.grid(menu["forSaleButtons"]).mouse_index is not None
     if submenu_name == "forSale" and not for_sale_focused:
         await focus_for_sale_index(mmenu, prev_for_sale_index)
     elif submenu_name == "inventory":